@@ -0,0 +1,252 @@
+"""Benchmarks for the tree model and the ingestion path.
+
+Synthetic message streams are fed to MqTreeModel through a fake MQTT listener, exactly like
+messages from the network thread, and applied in batches like the batch timer does. No
+broker or display is needed, Qt runs on the offscreen platform.
+
+Every workload runs in its own process so peak RSS is measured per workload. Run from the
+repository root:
+
+    python -m benchmarks.bench                   # Run all workloads, compare with the baseline
+    python -m benchmarks.bench hot storm         # Run some of them
+    python -m benchmarks.bench --save-baseline   # Store the results as the new baseline
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterator, List, Tuple
+import argparse
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MESSAGES = 100_000
+# Each workload is run this many times and the fastest run is reported, like timeit does
+DEFAULT_REPEAT = 3
+# Messages applied per batch, about what arrives in one batch interval at 40k msgs/s
+DEFAULT_BATCH_SIZE = 2_000
+# Relative slowdown of the throughput or median latency that counts as a regression. Runs on
+# a busy machine easily vary by 15%.
+DEFAULT_TOLERANCE = 0.20
+
+
+class FakeMessage:
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = False
+
+
+class FakeMqttListener:
+    """Stands in for MqttListener, messages are injected with send"""
+
+    def __init__(self):
+        self._message_listeners = []
+
+    def add_connect_listener(self, _connect_listener):
+        pass
+
+    def add_message_listener(self, message_listener):
+        self._message_listeners.append(message_listener)
+
+    def to_config(self) -> dict:
+        return {"host": "benchmark", "port": 1883, "username": None, "password": None}
+
+    def send(self, message: FakeMessage):
+        for listener in self._message_listeners:
+            listener(None, None, message)
+
+
+def _wide(rng: random.Random) -> Iterator[Tuple[str, bytes]]:
+    # Many siblings below few parents
+    while True:
+        yield f"wide/{rng.randrange(20)}/{rng.randrange(5000)}", b"%d" % rng.randrange(1000)
+
+
+def _deep(rng: random.Random) -> Iterator[Tuple[str, bytes]]:
+    # 12 levels with a branching factor of 2
+    while True:
+        path = "/".join(f"d{level}_{rng.randrange(2)}" for level in range(12))
+        yield path, b"%.3f" % rng.random()
+
+
+def _hot(rng: random.Random) -> Iterator[Tuple[str, bytes]]:
+    # A few topics receive most of the traffic, their history churns through the limits
+    while True:
+        if rng.random() < 0.9:
+            topic = f"hot/sensor{rng.randrange(20)}"
+        else:
+            topic = f"cold/{rng.randrange(50)}/sensor{rng.randrange(100)}"
+        yield topic, b'{"value": %.4f, "unit": "C"}' % (rng.random() * 100)
+
+
+def _storm(rng: random.Random) -> Iterator[Tuple[str, bytes]]:
+    # Every message discovers a new topic
+    for i in itertools.count():
+        yield f"storm/{i // 10_000}/{i // 100 % 100}/device{i % 100}/state", b"online"
+
+
+WORKLOADS: Dict[str, Callable[[random.Random], Iterator[Tuple[str, bytes]]]] = {
+    "wide": _wide,
+    "deep": _deep,
+    "hot": _hot,
+    "storm": _storm,
+}
+
+
+def run_workload(name: str, messages: int, batch_size: int, repeat: int) -> dict:
+    from PySide6 import QtCore
+
+    _app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    rng = random.Random(name)
+    stream = [
+        FakeMessage(topic, payload)
+        for topic, payload in itertools.islice(WORKLOADS[name](rng), messages)
+    ]
+
+    result = max(
+        (_run_stream(stream, batch_size) for _ in range(repeat)),
+        key=lambda result: result["msgs_per_s"],
+    )
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def _run_stream(stream: List[FakeMessage], batch_size: int) -> dict:
+    from models.mqtreemodel import MqTreeModel
+    from models.payloadhistory import MqHistoryLimits
+
+    listener = FakeMqttListener()
+    model = MqTreeModel(
+        mqtt_listener=listener,
+        queue_size=max(batch_size, 1),
+        history_limits=MqHistoryLimits(max_entries=1000),
+    )
+    model.pause_ingestion()  # Batches are applied explicitly below
+
+    latencies = np.empty(len(stream))
+    start = time.perf_counter()
+    for first in range(0, len(stream), batch_size):
+        batch = stream[first : first + batch_size]
+        sent = np.empty(len(batch))
+        for i, message in enumerate(batch):
+            sent[i] = time.perf_counter()
+            listener.send(message)
+        model.process_pending()
+        # A message's latency is the time from its arrival until it is in the tree
+        latencies[first : first + len(batch)] = time.perf_counter() - sent
+    elapsed = time.perf_counter() - start
+
+    assert model.dropped_messages() == 0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1_000_000
+    return {
+        "messages": len(stream),
+        "topics": model.root().recursive_child_count(leaves=True),
+        "msgs_per_s": len(stream) / elapsed,
+        "latency_p50_us": p50,
+        "latency_p95_us": p95,
+        "latency_p99_us": p99,
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Print the results next to the baseline, returns the regressions"""
+    regressions = []
+    print(
+        f"{'workload':<8} {'msgs/s':>10} {'p50 us':>9} {'p99 us':>9} {'RSS MB':>8}  vs baseline"
+    )
+    for name, result in results.items():
+        line = (
+            f"{name:<8} {result['msgs_per_s']:>10.0f} {result['latency_p50_us']:>9.1f} "
+            f"{result['latency_p99_us']:>9.1f} {result['peak_rss_mb']:>8.1f}"
+        )
+        base = baseline.get(name)
+        if base:
+            throughput = result["msgs_per_s"] / base["msgs_per_s"] - 1
+            # The tail latency is too noisy to compare
+            latency = result["latency_p50_us"] / base["latency_p50_us"] - 1
+            line += f"  msgs/s {throughput:+.1%}, p50 {latency:+.1%}"
+            if throughput < -tolerance or latency > tolerance:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="MQTT Navigator benchmarks")
+    parser.add_argument("workloads", nargs="*", help=f"Workloads to run: {', '.join(WORKLOADS)}")
+    parser.add_argument("-n", "--messages", type=int, default=DEFAULT_MESSAGES)
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Relative slowdown reported as a regression",
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv[1:])
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload {name}")
+
+    if args.single:  # Child process running one workload, see below
+        result = run_workload(args.workloads[0], args.messages, args.batch_size, args.repeat)
+        json.dump(result, sys.stdout)
+        return 0
+
+    results = {}
+    for name in args.workloads or WORKLOADS:
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench",
+                "--single",
+                name,
+                f"--messages={args.messages}",
+                f"--batch-size={args.batch_size}",
+                f"--repeat={args.repeat}",
+            ],
+            check=True,
+            stdout=subprocess.PIPE,
+            cwd=REPOSITORY_PATH,
+        ).stdout
+        results[name] = json.loads(output)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({**baseline, **results}, baseline_file, indent=2, sort_keys=True)
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,8 +1,34 @@
 from PySide6.QtCore import Qt
 
 FULL_TOPIC_ROLE = Qt.ItemDataRole.UserRole + 1
-SESSION_FILE_TYPES = "MQTT Navigator sessions (*.mqtt-navigator);;All files (*)"
+SESSION_FILE_TYPES = (
+    "MQTT Navigator sessions (*.mqtt-navigator);;MQTT Navigator captures (*.mqtt-capture);;"
+    "All files (*)"
+)
+SESSION_BINARY_FILE_TYPE = "MQTT Navigator sessions (*.mqtt-navigator)"
+SESSION_JSON_FILE_TYPE = "MQTT Navigator sessions, JSON (*.mqtt-navigator)"
+SESSION_SAVE_FILE_TYPES = f"{SESSION_BINARY_FILE_TYPE};;{SESSION_JSON_FILE_TYPE}"
 
 SESSION_HISTORY_KEY = "h"
 SESSION_CHILDREN_KEY = "c"
-SESSION_TOPIC_FRAGMENT_KEY = "t"
\ No newline at end of file
+SESSION_TOPIC_FRAGMENT_KEY = "t"
+# History indexes of the payloads stored base64 encoded because they aren't UTF-8
+SESSION_BINARY_KEY = "b"
+
+DEFAULT_SUBSCRIPTION = "#"
+
+DEFAULT_BATCH_INTERVAL_MS = 50
+DEFAULT_INGEST_QUEUE_SIZE = 200_000
+# Messages applied at once when draining the queue within a time budget
+INGEST_CHUNK_SIZE = 1000
+
+DEFAULT_HISTORY_MAX_ENTRIES = 10_000
+DEFAULT_HISTORY_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_HISTORY_TOTAL_MAX_BYTES = 1024 * 1024 * 1024
+
+PAYLOAD_TEXT_CACHE_SIZE = 4096
+# Larger payloads aren't cached, which bounds the cache to about 4096 * 2 * 1 KiB
+PAYLOAD_TEXT_CACHE_MAX_PAYLOAD_SIZE = 1024
+DECODED_PAYLOAD_CACHE_SIZE = 256
+
+DEFAULT_CAPTURE_MAX_BYTES = 256 * 1024 * 1024
@@ -0,0 +1,220 @@
+"""Lightweight instrumentation: counters, gauges and timing histograms.
+
+Metrics are registered in the module level registry by the code they instrument. They can be
+shown in the metrics dock, exported to JSON, or served over HTTP in the Prometheus text
+format. Each counter and histogram must only be updated from a single thread, readers on
+other threads may see slightly stale values.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Union
+import bisect
+import http.server
+import json
+import threading
+import time
+
+PROMETHEUS_PREFIX = "mqtt_navigator_"
+
+
+class Counter:
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Gauge:
+    """A value read when the metrics are collected"""
+
+    __slots__ = ("name", "help", "_read")
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self._read = read
+
+    @property
+    def value(self) -> float:
+        return self._read()
+
+
+class ReadCounter(Gauge):
+    """A count kept by another object, read when the metrics are collected. It only ever
+    increases, so it is exported as a counter."""
+
+    __slots__ = ()
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *_exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram:
+    """Distribution of durations in seconds, in buckets doubling from 1 µs to about 8 s"""
+
+    BOUNDS = [1e-6 * 2**i for i in range(24)]
+
+    __slots__ = ("name", "help", "counts", "count", "sum", "max")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.counts = [0] * (len(self.BOUNDS) + 1)  # The last bucket is unbounded
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def time(self) -> _Timer:
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        # Gauges read the current state of an object, so a newer object replaces an older one
+        gauge = self._metrics[name] = Gauge(name, help, read)
+        return gauge
+
+    def read_counter(self, name: str, help: str, read: Callable[[], int]) -> ReadCounter:
+        # Like gauges, a newer object replaces an older one
+        counter = self._metrics[name] = ReadCounter(name, help, read)
+        return counter
+
+    def metrics(self) -> List[Metric]:
+        return list(self._metrics.values())
+
+    def snapshot(self) -> dict:
+        """Current values, histograms are summarized"""
+        return {
+            metric.name: metric.summary() if isinstance(metric, Histogram) else metric.value
+            for metric in self.metrics()
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w") as metrics_file:
+            json.dump({"time": time.time(), "metrics": self.snapshot()}, metrics_file, indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            name = PROMETHEUS_PREFIX + metric.name
+            lines.append(f"# HELP {name} {metric.help}")
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(metric.BOUNDS, metric.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{le="+Inf"}} {metric.count}')
+                lines.append(f"{name}_sum {metric.sum}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                kind = "counter" if isinstance(metric, (Counter, ReadCounter)) else "gauge"
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class MetricsHttpServer:
+    """Serves the metrics on /metrics in the Prometheus text format, and as JSON on
+    /metrics.json. Only listens on localhost by default."""
+
+    def __init__(
+        self, port: int, host: str = "127.0.0.1", metrics: Optional[MetricsRegistry] = None
+    ):
+        metrics = metrics or registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_prometheus().encode("UTF-8")
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode("UTF-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_args):
+                pass  # Don't log every scrape
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
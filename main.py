@@ -1,10 +1,32 @@
 #!/usr/bin/env python3
+from typing import Callable, Dict, List, Optional
 import sys
 import argparse
+import functools
+import signal
+import threading
+import time
 
-from PySide6 import QtWidgets
+from common import consts, metrics
+from models.decoders import MqDecoderRule
+from models.ingestrules import MqIngestFilter, MqIngestRule
+from models.mqttlistener import parse_subscription
+from models.payloadhistory import MqHistoryLimits
 
-from views.startupwindow import StartupWindow
+# Interval in seconds at which the recording status is printed and the capture flushed
+RECORD_STATUS_INTERVAL = 5
+
+
+def argument_type(parse: Callable[[str], object]) -> Callable[[str], object]:
+    """Report the ValueErrors of parse as argument errors"""
+
+    def parse_argument(text: str):
+        try:
+            return parse(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    return parse_argument
 
 
 def main(argv):
@@ -14,8 +36,147 @@ def main(argv):
     parser.add_argument("-u", "--username")
     parser.add_argument("-p", "--password")
     parser.add_argument("-l", "--load-session", help="Saved session file to load")
+    parser.add_argument(
+        "-s",
+        "--subscribe",
+        metavar="TOPIC[:QOS]",
+        type=argument_type(parse_subscription),
+        action="append",
+        help="Topic filter to subscribe to, with an optional QoS, can be repeated. Defaults to "
+        "the loaded session's subscriptions, or #.",
+    )
+    # All rules are appended to ingest_rules in the order given, the first matching rule applies
+    parser.add_argument(
+        "--drop",
+        metavar="PATTERN",
+        dest="ingest_rules",
+        type=argument_type(functools.partial(MqIngestRule.parse, "drop")),
+        action="append",
+        help="Drop all messages of the topics matching the topic filter, can be repeated",
+    )
+    parser.add_argument(
+        "--sample",
+        metavar="PATTERN:N",
+        dest="ingest_rules",
+        type=argument_type(functools.partial(MqIngestRule.parse, "sample")),
+        action="append",
+        help="Keep only every Nth message of each topic matching the topic filter",
+    )
+    parser.add_argument(
+        "--throttle",
+        metavar="PATTERN:MS",
+        dest="ingest_rules",
+        type=argument_type(functools.partial(MqIngestRule.parse, "throttle")),
+        action="append",
+        help="Keep at most one message every MS milliseconds of each topic matching the "
+        "topic filter",
+    )
+    parser.add_argument(
+        "--decoder",
+        metavar="PATTERN=DECODER",
+        dest="decoder_rules",
+        type=argument_type(MqDecoderRule.parse),
+        action="append",
+        help="Decode the payloads of the topics matching the topic filter with json, cbor, "
+        "msgpack, hex or protobuf:DESCRIPTOR_SET:MESSAGE, can be repeated. Other topics are "
+        "decoded as JSON.",
+    )
+    parser.add_argument(
+        "--batch-interval",
+        type=int,
+        default=consts.DEFAULT_BATCH_INTERVAL_MS,
+        help="Interval in milliseconds at which received messages are applied to the tree",
+    )
+    parser.add_argument(
+        "--history-max-entries",
+        type=int,
+        default=consts.DEFAULT_HISTORY_MAX_ENTRIES,
+        help="Maximum number of history entries kept per topic (0 for unlimited)",
+    )
+    parser.add_argument(
+        "--history-max-bytes",
+        type=int,
+        default=consts.DEFAULT_HISTORY_MAX_BYTES,
+        help="Maximum size of the history kept per topic in bytes (0 for unlimited)",
+    )
+    parser.add_argument(
+        "--history-total-entries",
+        type=int,
+        default=0,
+        help="Maximum number of history entries kept for all topics (0 for unlimited)",
+    )
+    parser.add_argument(
+        "--history-total-bytes",
+        type=int,
+        default=consts.DEFAULT_HISTORY_TOTAL_MAX_BYTES,
+        help="Memory budget for the history of all topics in bytes, the least recently updated "
+        "or viewed topics lose their history first (0 for unlimited)",
+    )
+
+    parser.add_argument(
+        "--record",
+        metavar="CAPTURE",
+        help="Record all messages to capture files without starting the GUI, "
+        "the captures can be opened as sessions",
+    )
+    parser.add_argument(
+        "--record-max-bytes",
+        type=int,
+        default=consts.DEFAULT_CAPTURE_MAX_BYTES,
+        help="Size in bytes at which recording continues in a new capture file (0 for unlimited)",
+    )
+    parser.add_argument(
+        "--record-max-files",
+        type=int,
+        default=0,
+        help="Number of most recent capture files to keep (0 for unlimited)",
+    )
+
+    parser.add_argument(
+        "--replay",
+        metavar="SESSION",
+        help="Replay the messages of a saved session or capture file in timestamp order",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Replay speed relative to the original timing (0 for as fast as possible)",
+    )
+    parser.add_argument(
+        "--replay-publish",
+        action="store_true",
+        help="Republish replayed messages to the broker instead of only showing them",
+    )
+
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve metrics on http://localhost:PORT/metrics (Prometheus) and /metrics.json",
+    )
 
     args, rest = parser.parse_known_args(argv[1:])
+    subscriptions = dict(args.subscribe) if args.subscribe else None
+    ingest_rules = args.ingest_rules or []
+    if args.replay_publish and not args.host:
+        parser.error("a host is required to republish replayed messages")
+
+    if args.metrics_port:
+        try:
+            metrics_server = metrics.MetricsHttpServer(args.metrics_port)
+        except OSError as e:
+            parser.error(f"can't serve metrics on port {args.metrics_port}: {e.strerror}")
+        metrics_server.start()
+
+    if args.record:
+        if not args.host:
+            parser.error("a host is required for recording")
+        return record(args, subscriptions, ingest_rules)
+
+    # Only needed for the GUI, so recording works on machines without a display
+    from PySide6 import QtWidgets
+    from views.startupwindow import StartupWindow
+
     app = QtWidgets.QApplication([argv[0]] + rest)
 
     window = StartupWindow(
@@ -24,11 +185,76 @@ def main(argv):
         username=args.username,
         password=args.password,
         load_session=args.load_session,
+        batch_interval_ms=args.batch_interval,
+        history_limits=MqHistoryLimits(
+            max_entries=args.history_max_entries,
+            max_bytes=args.history_max_bytes,
+            total_max_entries=args.history_total_entries,
+            total_max_bytes=args.history_total_bytes,
+        ),
+        replay=args.replay,
+        replay_speed=args.replay_speed,
+        replay_publish=args.replay_publish,
+        subscriptions=subscriptions,
+        ingest_rules=ingest_rules,
+        decoder_rules=args.decoder_rules or [],
     )
     window.show()
 
-    app.exec()
+    return app.exec()
+
+
+def record(args, subscriptions: Optional[Dict[str, int]], ingest_rules: List[MqIngestRule]) -> int:
+    from models.capture import MqCaptureWriter
+    from models.mqttlistener import MqttListener
+
+    listener = MqttListener(args.host, args.port, args.username, args.password, subscriptions)
+    writer = MqCaptureWriter(
+        args.record,
+        listener.to_config(),
+        max_bytes=args.record_max_bytes,
+        max_files=args.record_max_files,
+    )
+
+    stop = threading.Event()
+    failed = False
+
+    def on_connection_failed(_client):
+        nonlocal failed
+        failed = True
+        stop.set()
+
+    ingest_filter = MqIngestFilter(ingest_rules)
+
+    def on_message(client, userdata, msg):
+        if not ingest_filter or ingest_filter.accept(msg.topic, time.time()):
+            writer.on_message(client, userdata, msg)
+
+    listener.add_message_listener(on_message)
+    listener.add_connect_fail_listener(on_connection_failed)
+    listener.add_connect_listener(
+        lambda *_args: print(f"Connected to {args.host}:{args.port}", file=sys.stderr)
+    )
+    signal.signal(signal.SIGINT, lambda *_args: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_args: stop.set())
+
+    listener.connect()
+    try:
+        while not stop.wait(RECORD_STATUS_INTERVAL):
+            writer.flush()
+            status = f"Recorded {writer.messages} messages, {writer.nbytes} bytes"
+            if ingest_filter:
+                status += f", {ingest_filter.dropped} filtered"
+            print(f"{status} to {writer.current_path}", file=sys.stderr)
+    finally:
+        listener.disconnect()
+        writer.close()
+
+    if failed:
+        print("Connection failed!", file=sys.stderr)
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main(sys.argv)
+    sys.exit(main(sys.argv))
@@ -0,0 +1,193 @@
+"""Capture files, append-only recordings of broker traffic.
+
+A capture starts with a header of the magic, the format version and the connection config as
+length-prefixed JSON. It is followed by one record per message: the timestamp, payload length,
+topic length, QoS and retain flag, then the UTF-8 topic and the raw payload. A capture that was
+cut short, e.g. by a crash, can be read up to its last complete record.
+
+Long recordings are split into numbered files, see MqCaptureWriter.
+"""
+
+from __future__ import annotations
+from typing import BinaryIO, Iterator, Optional
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from common import consts
+from models.mqtreemodel import MqTreeNode
+from models.payloadhistory import MqHistoryBudget, MqPayloadHistory
+
+
+CAPTURE_MAGIC = b"MQNAVCAP"
+CAPTURE_VERSION = 1
+CAPTURE_EXTENSION = ".mqtt-capture"
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Magic, version, config length
+_HEADER = struct.Struct("<8sHI")
+# Timestamp, payload length, topic length, QoS, retain
+_RECORD = struct.Struct("<dIHBB")
+
+MqCapturedMessage = collections.namedtuple(
+    "MqCapturedMessage", ["topic", "payload", "timestamp", "qos", "retain"]
+)
+
+
+class CaptureFormatError(ValueError):
+    pass
+
+
+class MqCaptureWriter:
+    """Appends received messages to capture files.
+
+    Once a file reaches max_bytes, the recording continues in a new one. Files are named after
+    path with a sequence number, e.g. traffic.0001.mqtt-capture for traffic.mqtt-capture, and
+    only the latest max_files of them are kept. Messages are written directly from the MQTT
+    network thread through a fixed size buffer, so memory use doesn't grow with the traffic.
+    0 means unlimited for both limits.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        config: dict,
+        *,
+        max_bytes: int = consts.DEFAULT_CAPTURE_MAX_BYTES,
+        max_files: int = 0,
+    ):
+        self._path = path
+        self._header = self._encode_header(config)
+        self._max_bytes = max_bytes
+        self._max_files = max_files
+
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._file_size = 0
+        self._file_index = 0
+        self._file_paths = []  # Capture files that are kept, oldest first
+
+        self.messages = 0
+        self.nbytes = 0
+        self._open_next()
+
+    @property
+    def current_path(self) -> str:
+        return self._file_paths[-1]
+
+    def on_message(self, _client, _userdata, msg):
+        self.write(msg.topic, msg.payload, time.time(), msg.qos, msg.retain)
+
+    def write(self, topic: str, payload: bytes, timestamp: float, qos: int = 0, retain=False):
+        topic = topic.encode("UTF-8")
+        record = _RECORD.pack(timestamp, len(payload), len(topic), qos, retain) + topic + payload
+
+        with self._lock:
+            if self._max_bytes and self._file_size >= self._max_bytes:
+                self._open_next()
+            self._file.write(record)
+            self._file_size += len(record)
+            self.messages += 1
+            self.nbytes += len(record)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _open_next(self):
+        if self._file:
+            self._file.close()
+
+        self._file_index += 1
+        stem, extension = os.path.splitext(self._path)
+        path = f"{stem}.{self._file_index:04d}{extension or CAPTURE_EXTENSION}"
+        self._file = open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+        self._file.write(self._header)
+        self._file_size = len(self._header)
+        self._file_paths.append(path)
+
+        if self._max_files:
+            for old_path in self._file_paths[: -self._max_files]:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            del self._file_paths[: -self._max_files]
+
+    @staticmethod
+    def _encode_header(config: dict) -> bytes:
+        config_data = json.dumps(config).encode("UTF-8")
+        return _HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, len(config_data)) + config_data
+
+
+class CaptureSession:
+    """A capture file opened as a session, the tree is built by applying all of its messages"""
+
+    lazy = False
+
+    def __init__(self, capture_file: BinaryIO):
+        self._data = mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, config_length = _HEADER.unpack_from(self._data)
+        if magic != CAPTURE_MAGIC:
+            raise CaptureFormatError("Not a capture file")
+        if version > CAPTURE_VERSION:
+            raise CaptureFormatError(f"Unsupported capture format version {version}")
+
+        self.config = json.loads(self._data[_HEADER.size : _HEADER.size + config_length])
+        self._records_offset = _HEADER.size + config_length
+
+    def messages(self) -> Iterator[MqCapturedMessage]:
+        data = self._data
+        offset = self._records_offset
+        end = len(data)
+        while offset + _RECORD.size <= end:
+            timestamp, payload_length, topic_length, qos, retain = _RECORD.unpack_from(data, offset)
+            topic_start = offset + _RECORD.size
+            payload_start = topic_start + topic_length
+            offset = payload_start + payload_length
+            if offset > end:  # Truncated record
+                return
+
+            yield MqCapturedMessage(
+                data[topic_start:payload_start].decode("UTF-8"),
+                data[payload_start:offset],
+                timestamp,
+                qos,
+                bool(retain),
+            )
+
+    def history_entry_count(self) -> int:
+        count = 0
+        offset = self._records_offset
+        end = len(self._data)
+        while offset + _RECORD.size <= end:
+            _, payload_length, topic_length, _, _ = _RECORD.unpack_from(self._data, offset)
+            offset += _RECORD.size + topic_length + payload_length
+            if offset <= end:
+                count += 1
+        return count
+
+    def build_tree(self, budget: Optional[MqHistoryBudget] = None) -> MqTreeNode:
+        root = MqTreeNode("", b"", MqPayloadHistory(budget))
+        nodes = {}  # Topic -> node
+        for topic, payload, timestamp, _qos, _retain in self.messages():
+            node = nodes.get(topic)
+            if not node:
+                node = root
+                for frag in topic.split("/"):
+                    node = node.find_child(frag) or node.append_child(
+                        MqTreeNode(frag, b"", MqPayloadHistory(budget))
+                    )
+                nodes[topic] = node
+            node.update_payload(payload, timestamp)
+        return root
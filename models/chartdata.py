@@ -0,0 +1,145 @@
+"""Numeric series of the history chart, and their downsampling for display.
+
+A series charts the payloads of a topic that are numbers, or a field of its decoded payloads
+given by a path of keys and list indexes.
+
+A line chart can't show more than a few points per pixel column, so instead of all the points
+only the first, last, minimum and maximum point of each column are drawn. The drawn line then
+looks the same as with all the points, spikes included, whatever the history length.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Optional, Tuple
+import math
+
+import numpy as np
+
+from models.numerichistory import MqNumericHistory, MqNumericPoints
+
+
+JsonPath = Tuple[Any, ...]  # Keys and list indexes
+
+
+def format_json_path(path: JsonPath) -> str:
+    text = ""
+    for key in path:
+        text += f"[{key}]" if isinstance(key, int) else f".{key}"
+    return text.lstrip(".")
+
+
+class MqChartSeries:
+    """Numeric values of the history of a topic, extracted as entries are appended.
+
+    path selects a field of the payloads decoded with decode, parsed into points of the
+    series' own. An empty path charts the payloads that are numbers, drawn from the numeric
+    history of the node without copying it.
+    """
+
+    def __init__(
+        self,
+        node,
+        path: JsonPath = (),
+        decode: Optional[Callable[[bytes], Any]] = None,
+    ):
+        self.node = node
+        self.path = path
+        self._decode = decode
+        self._numeric: Optional[MqNumericHistory] = None
+        # Absolute index of the next entry and number of points, as of the last update
+        self._end = 0
+        self._length = 0
+        if path:
+            history = node.payload_history
+            self._numeric = MqNumericHistory(history, self.value, history.budget)
+
+    @property
+    def name(self) -> str:
+        topic = self.node.full_topic()
+        return f"{topic} {format_json_path(self.path)}" if self.path else topic
+
+    @property
+    def points(self) -> MqNumericPoints:
+        return self._numeric.points
+
+    def value(self, payload: bytes) -> float:
+        """The value of the field of a payload to chart, NaN if it hasn't one"""
+        try:
+            value = self._decode(payload)
+            for key in self.path:
+                value = value[key]
+            if isinstance(value, (int, float)):
+                return float(value)
+        except (ValueError, KeyError, IndexError, TypeError, RecursionError, OverflowError):
+            pass
+        return math.nan
+
+    def update(self) -> Tuple[bool, int]:
+        """Follow the changes of the history, returns whether points were evicted or replaced,
+        and the number of points appended"""
+        if self.path:
+            evicted, appended = self._numeric.update()
+            return bool(evicted), appended
+
+        # Shared, it may have been updated since for others, compare with the last update
+        numeric = self.node.numeric_history()
+        points = numeric.points
+        replaced = numeric is not self._numeric  # New, or dropped by the budget and parsed again
+        appended = len(points) - int(np.searchsorted(points.indexes, self._end))
+        evicted = replaced or len(points) - appended < self._length
+        self._numeric = numeric
+        self._end = numeric.end_index
+        self._length = len(points)
+        return evicted, len(points) if replaced else appended
+
+    def release(self):
+        """Free the points of a field, the numeric history of the node stays cached"""
+        if self.path:
+            self._numeric.release()
+
+
+def downsample_min_max(
+    x: np.ndarray,
+    y: np.ndarray,
+    x_min: float,
+    x_max: float,
+    columns: int,
+    x_sorted: bool = True,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The points to draw between x_min and x_max on a chart columns pixels wide.
+
+    The points just outside the range are kept so the line reaches the edges. Ranges with no
+    more than 4 points per column are returned as they are. If x isn't sorted, the points are
+    split in runs of the same length instead of pixel columns, which keeps the drawing order.
+    """
+    if x_sorted:
+        start = max(int(np.searchsorted(x, x_min, "left")) - 1, 0)
+        end = min(int(np.searchsorted(x, x_max, "right")) + 1, len(x))
+        x = x[start:end]
+        y = y[start:end]
+    else:
+        visible = (x >= x_min) & (x <= x_max)
+        x = x[visible]
+        y = y[visible]
+    columns = max(columns, 1)
+    if len(x) <= 4 * columns:
+        return x, y
+
+    # First point of each pixel column that has points
+    if x_sorted:
+        edges = np.linspace(x_min, x_max, columns + 1)[1:-1]
+        starts = np.unique(np.concatenate(([0], np.searchsorted(x, edges, "left"))))
+        starts = starts[starts < len(x)]
+    else:
+        starts = np.unique(np.linspace(0, len(x), columns, endpoint=False).astype(np.int64))
+    counts = np.diff(starts, append=len(x))
+    column_of = np.repeat(np.arange(len(starts)), counts)
+
+    picked = [starts, starts + counts - 1]
+    for extremes in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        # The first point of each column equal to its extreme
+        candidates = np.flatnonzero(y == extremes[column_of])
+        _columns, first = np.unique(column_of[candidates], return_index=True)
+        picked.append(candidates[first])
+
+    indexes = np.unique(np.concatenate(picked))
+    return x[indexes], y[indexes]
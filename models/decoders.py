@@ -0,0 +1,236 @@
+"""Payload decoders for the decoded view of the selected topic.
+
+A decoder turns a payload into a tree of dicts, lists and scalars. Topic filters choose the
+decoder of each topic, topics matching none are decoded as JSON. CBOR, MessagePack and protobuf
+need the optional cbor2, msgpack and protobuf packages.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Sequence
+import collections
+import json
+
+from common import consts, metrics
+from models.mqttlistener import validate_topic_filter
+from models.topictrie import MqTopicTrie
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    from google.protobuf import descriptor_pb2, descriptor_pool, json_format, message_factory
+    from google.protobuf.message import DecodeError as ProtobufDecodeError
+except ImportError:
+    descriptor_pb2 = None
+
+
+_decode_time = metrics.registry.histogram("payload_decode_seconds", "Time to decode a payload")
+_decode_cache_hits = metrics.registry.counter(
+    "payload_decode_cache_hits_total", "Payloads shown without decoding them again"
+)
+
+# Bytes per line of the hex dump
+HEX_DUMP_WIDTH = 16
+
+Decode = Callable[[bytes], Any]
+
+
+def _to_tree(value: Any) -> Any:
+    """Convert decoded CBOR and MessagePack values to what the tree view can show"""
+    if isinstance(value, dict):
+        # Keys can be of any type, and of several types in one map
+        return {str(key): _to_tree(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_tree(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex(" ")
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)  # Tags, extension types, timestamps...
+
+
+def decode_json(payload: bytes) -> Any:
+    return json.loads(payload)
+
+
+def decode_cbor(payload: bytes) -> Any:
+    return _to_tree(cbor2.loads(payload))
+
+
+def decode_msgpack(payload: bytes) -> Any:
+    try:
+        return _to_tree(msgpack.unpackb(payload, strict_map_key=False))
+    except TypeError as e:  # Unhashable map keys
+        raise ValueError(str(e))
+
+
+def decode_hex(payload: bytes) -> Any:
+    """A hex dump, one line per HEX_DUMP_WIDTH bytes keyed by its offset"""
+    lines = {}
+    for offset in range(0, len(payload), HEX_DUMP_WIDTH):
+        chunk = payload[offset : offset + HEX_DUMP_WIDTH]
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+        lines[f"{offset:08x}"] = f"{chunk.hex(' '):<{HEX_DUMP_WIDTH * 3}} {text}"
+    return lines
+
+
+def protobuf_decoder(descriptor_set_path: str, message_name: str) -> Decode:
+    """Decoder for messages of a type described in a descriptor set, as written by
+    protoc --include_imports --descriptor_set_out"""
+    if descriptor_pb2 is None:
+        raise ValueError("The protobuf decoder requires the protobuf package")
+    try:
+        with open(descriptor_set_path, "rb") as descriptor_file:
+            file_set = descriptor_pb2.FileDescriptorSet.FromString(descriptor_file.read())
+    except (OSError, ProtobufDecodeError) as e:
+        raise ValueError(f"Can't read the descriptor set {descriptor_set_path}: {e}")
+
+    pool = descriptor_pool.DescriptorPool()
+    for file in file_set.file:  # Dependencies come first with --include_imports
+        pool.Add(file)
+    try:
+        message_class = message_factory.GetMessageClass(pool.FindMessageTypeByName(message_name))
+    except KeyError:
+        raise ValueError(f"No message {message_name} in {descriptor_set_path}")
+
+    def decode_protobuf(payload: bytes) -> Any:
+        try:
+            message = message_class.FromString(payload)
+        except ProtobufDecodeError as e:
+            raise ValueError(str(e))
+        return json_format.MessageToDict(message, preserving_proto_field_name=True)
+
+    return decode_protobuf
+
+
+DECODERS: Dict[str, Decode] = {
+    "json": decode_json,
+    "cbor": decode_cbor,
+    "msgpack": decode_msgpack,
+    "hex": decode_hex,
+}
+TITLES = {
+    "json": "JSON",
+    "cbor": "CBOR",
+    "msgpack": "MessagePack",
+    "hex": "Hex",
+    "protobuf": "Protobuf",
+}
+# Decoder -> the optional package it needs, if it isn't installed
+_MISSING_PACKAGES = {
+    "cbor": None if cbor2 else "cbor2",
+    "msgpack": None if msgpack else "msgpack",
+}
+
+
+def make_decoder(spec: str) -> Decode:
+    """Create the decoder named by spec: json, cbor, msgpack, hex, or
+    protobuf:DESCRIPTOR_SET:MESSAGE. Raises ValueError if it isn't valid."""
+    name, _separator, arguments = spec.partition(":")
+    if name == "protobuf":
+        descriptor_set_path, separator, message_name = arguments.rpartition(":")
+        if not separator or not descriptor_set_path or not message_name:
+            raise ValueError(f"Expected protobuf:DESCRIPTOR_SET:MESSAGE: {spec}")
+        return protobuf_decoder(descriptor_set_path, message_name)
+
+    try:
+        decode = DECODERS[spec]
+    except KeyError:
+        names = ", ".join([*DECODERS, "protobuf:DESCRIPTOR_SET:MESSAGE"])
+        raise ValueError(f"Unknown decoder {spec}, expected one of {names}")
+    missing = _MISSING_PACKAGES.get(spec)
+    if missing:
+        raise ValueError(f"The {spec} decoder requires the {missing} package")
+    return decode
+
+
+@dataclass(frozen=True)
+class MqDecoderRule:
+    pattern: str  # MQTT topic filter
+    name: str  # Decoder spec, see make_decoder
+    decode: Decode
+
+    @staticmethod
+    def parse(text: str) -> MqDecoderRule:
+        """Parse a rule given on the command line as PATTERN=DECODER. Raises ValueError if it
+        isn't valid."""
+        pattern, separator, spec = text.partition("=")
+        if not separator:
+            raise ValueError(f"Expected PATTERN=DECODER: {text}")
+        validate_topic_filter(pattern)
+        return MqDecoderRule(pattern, spec, make_decoder(spec))
+
+
+@dataclass(frozen=True)
+class MqDecodedPayload:
+    decoder: str  # Spec of the decoder used
+    value: Any = None  # The decoded tree, None if decoding failed
+    error: Optional[str] = None
+
+    @property
+    def title(self) -> str:
+        return TITLES[self.decoder.partition(":")[0]]
+
+
+_DEFAULT_RULE = MqDecoderRule("#", "json", decode_json)
+
+
+class MqPayloadDecoders:
+    """Decodes payloads with the decoder chosen by their topic.
+
+    The decoded payloads are remembered by payload, so an unchanged payload of a topic updating
+    quickly is decoded once, and shown as the same object each time. Only used from the GUI
+    thread.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[MqDecoderRule] = (),
+        cache_size: int = consts.DECODED_PAYLOAD_CACHE_SIZE,
+    ):
+        self.rules = list(rules)
+        self._trie = MqTopicTrie()
+        for rule in self.rules:
+            self._trie.add(rule.pattern, rule)
+        self._topics: Dict[str, MqDecoderRule] = {}
+        self._cache_size = cache_size
+        # (decode, payload) -> decoded payload, least recently used first
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+
+    def rule(self, topic: str) -> MqDecoderRule:
+        try:
+            return self._topics[topic]
+        except KeyError:
+            rule = self._topics[topic] = self._trie.match(topic) or _DEFAULT_RULE
+            return rule
+
+    def decode(self, topic: str, payload: bytes) -> MqDecodedPayload:
+        rule = self.rule(topic)
+        key = (rule.decode, payload)
+        try:
+            decoded = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(key)
+            _decode_cache_hits.inc()
+            return decoded
+
+        with _decode_time.time():
+            try:
+                decoded = MqDecodedPayload(rule.name, rule.decode(payload))
+            except (ValueError, RecursionError) as e:
+                decoded = MqDecodedPayload(rule.name, error=str(e))
+
+        self._cache[key] = decoded
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return decoded
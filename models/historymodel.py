@@ -0,0 +1,88 @@
+from __future__ import annotations
+from typing import Optional
+
+from PySide6 import QtCore
+
+from models.payloadhistory import MqPayloadHistory
+
+
+class MqHistoryModel(QtCore.QAbstractTableModel):
+    """Table of the payload history of a topic, oldest entry first.
+
+    Rows are read from the history when the view asks for them, so showing a history costs the
+    same whatever its length. The history is absolutely indexed by its appended count, so
+    refresh() can tell the entries evicted from the front from the ones appended at the back
+    since the last refresh, and only signals those rows.
+    """
+
+    COLUMNS = ("Timestamp", "Payload")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._history: Optional[MqPayloadHistory] = None
+        # Absolute history indexes of the entries shown
+        self._shown_first = 0
+        self._shown_end = 0
+
+    def set_history(self, history: Optional[MqPayloadHistory]):
+        self.beginResetModel()
+        self._history = history
+        # Doesn't load the history of lazily loaded sessions, only the shown rows are read
+        self._shown_first = history.first_index if history is not None else 0
+        self._shown_end = history.appended_count if history is not None else 0
+        self.endResetModel()
+
+    def refresh(self) -> (int, int):
+        """Show the changes of the history, returns the number of rows removed from the front
+        and appended at the back"""
+        history = self._history
+        if history is None:
+            return 0, 0
+
+        first = history.first_index
+        evicted = max(min(first, self._shown_end) - self._shown_first, 0)
+        if evicted:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, evicted - 1)
+            self._shown_first += evicted
+            self.endRemoveRows()
+        if self._shown_first < first:  # Entries were appended and evicted without being shown
+            self._shown_first = self._shown_end = first
+
+        appended = history.appended_count - self._shown_end
+        if appended:
+            rows = self.rowCount()
+            self.beginInsertRows(QtCore.QModelIndex(), rows, rows + appended - 1)
+            self._shown_end = history.appended_count
+            self.endInsertRows()
+        return evicted, appended
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self._shown_end - self._shown_first
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.COLUMNS)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+
+        # Entries evicted since the last refresh are left blank until it removes their rows
+        entry = self._shown_first - self._history.first_index + index.row()
+        if not 0 <= entry < len(self._history):
+            return None
+
+        payload, timestamp = self._history[entry]
+        return str(timestamp) if index.column() == 0 else payload
+
+    def headerData(
+        self, section: int, orientation: QtCore.Qt.Orientation, role=QtCore.Qt.DisplayRole
+    ):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.COLUMNS[section]
+        return str(section + 1)
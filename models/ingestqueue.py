@@ -0,0 +1,73 @@
+from __future__ import annotations
+from typing import Dict, Optional, Sequence
+import collections
+import threading
+
+
+MqIncomingMessage = collections.namedtuple("MqIncomingMessage", ["topic", "payload", "timestamp"])
+
+
+class MqIngestQueue:
+    """Bounded queue handing received messages from the MQTT network thread to the GUI thread.
+
+    A message arriving while the queue is full never blocks the network thread, so the broker
+    connection never backs up. Instead the queue is coalesced to the latest message of each
+    topic, so the tree still ends up showing every topic's latest payload. If that doesn't free
+    a quarter of the queue, e.g. during a topic discovery storm, the oldest messages are
+    dropped down to three quarters. Both are counted as dropped.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def put(self, message: MqIncomingMessage) -> bool:
+        """Queue a message, returns False if messages had to be dropped to make room"""
+        with self._lock:
+            full = len(self._queue) >= self._max_size
+            if full:
+                self._make_room()
+            self._queue.append(message)
+            return not full
+
+    def drain(self, max_count: Optional[int] = None) -> Sequence[MqIncomingMessage]:
+        """Remove and return the oldest max_count messages, all of them if None"""
+        with self._lock:
+            queue = self._queue
+            if max_count is None or len(queue) <= max_count:
+                # Swap the whole deque out instead of popping entries one by one
+                self._queue = collections.deque()
+                return queue
+            return [queue.popleft() for _ in range(max_count)]
+
+    def _make_room(self):
+        # Called with the lock held. Each call frees at least a quarter of the queue, so the
+        # O(n) passes are amortized over as many messages.
+        queue = self._queue
+        length = len(queue)
+        latest: Dict[str, int] = {}
+        for index, message in enumerate(queue):
+            latest[message.topic] = index
+        if len(latest) < length:
+            queue = collections.deque(
+                message for index, message in enumerate(queue) if latest[message.topic] == index
+            )
+
+        target = self._max_size * 3 // 4
+        while len(queue) > target:
+            queue.popleft()
+        self._queue = queue
+        self._dropped += length - len(queue)
@@ -0,0 +1,132 @@
+"""Client-side ingestion rules, applied to received messages before they are queued.
+
+A rule matches topics with an MQTT topic filter and drops all of their messages, keeps only
+every Nth message of each topic, or keeps at most one message per topic in an interval. When
+several rules match a topic, the first one given applies.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from common import metrics
+from models.mqttlistener import validate_topic_filter
+from models.topictrie import MqTopicTrie
+
+
+_messages_filtered = metrics.registry.counter(
+    "messages_filtered_total", "Messages dropped by the ingestion rules"
+)
+
+
+@dataclass(frozen=True)
+class MqIngestRule:
+    pattern: str  # MQTT topic filter
+    drop: bool = False  # Drop all messages
+    every: int = 1  # Keep every Nth message of each topic
+    min_interval: float = 0.0  # Keep at most one message per topic in this many seconds
+
+    def describe(self) -> str:
+        if self.drop:
+            return f"drop {self.pattern}"
+        parts = [self.pattern]
+        if self.every > 1:
+            parts.append(f"1 in {self.every} messages")
+        if self.min_interval:
+            parts.append(f"at most every {self.min_interval * 1000:g} ms")
+        return ", ".join(parts)
+
+    @staticmethod
+    def parse(kind: str, text: str) -> MqIngestRule:
+        """Parse a rule given on the command line: PATTERN for drop, PATTERN:N for sample and
+        PATTERN:MS for throttle. Raises ValueError if it isn't valid."""
+        if kind == "drop":
+            rule = MqIngestRule(text, drop=True)
+        else:
+            pattern, separator, value = text.rpartition(":")
+            if not separator:
+                raise ValueError(f"Expected PATTERN:{'N' if kind == 'sample' else 'MS'}: {text}")
+            if kind == "sample":
+                every = int(value)
+                if every < 1:
+                    raise ValueError(f"N must be at least 1: {text}")
+                rule = MqIngestRule(pattern, every=every)
+            elif kind == "throttle":
+                interval = float(value) / 1000
+                if interval < 0:
+                    raise ValueError(f"The interval must not be negative: {text}")
+                rule = MqIngestRule(pattern, min_interval=interval)
+            else:
+                raise ValueError(f"Unknown rule kind {kind}")
+
+        validate_topic_filter(rule.pattern)
+        return rule
+
+
+class _TopicState:
+    __slots__ = ("rule", "index", "count", "last_kept")
+
+    def __init__(self, rule: MqIngestRule, index: int):
+        self.rule = rule
+        self.index = index
+        self.count = 0
+        self.last_kept = float("-inf")
+
+
+class MqIngestFilter:
+    """Applies ingestion rules to received messages.
+
+    The rules are compiled into a topic trie, and the rule matching each topic is remembered,
+    so after the first message of a topic deciding costs a dict lookup. Not thread-safe:
+    MqTreeModel.on_message serializes the threads receiving messages, the network thread and
+    the replay thread.
+    """
+
+    def __init__(self, rules: Sequence[MqIngestRule]):
+        self.rules = list(rules)
+        self.dropped = 0
+        self.dropped_by_rule = [0] * len(self.rules)
+
+        self._trie = MqTopicTrie()
+        for index, rule in enumerate(self.rules):
+            self._trie.add(rule.pattern, index)
+        # Topic -> its state, or None if no rule matches it
+        self._topics: Dict[str, Optional[_TopicState]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def accept(self, topic: str, timestamp: float) -> bool:
+        """Whether a message received at timestamp, in seconds, should be kept"""
+        try:
+            state = self._topics[topic]
+        except KeyError:
+            index = self._trie.match(topic)
+            state = self._topics[topic] = (
+                None if index is None else _TopicState(self.rules[index], index)
+            )
+        if state is None:
+            return True
+
+        rule = state.rule
+        keep = not rule.drop
+        if keep and rule.every > 1:
+            keep = state.count % rule.every == 0
+            state.count += 1
+        if keep and rule.min_interval:
+            keep = timestamp - state.last_kept >= rule.min_interval
+            if keep:
+                state.last_kept = timestamp
+
+        if not keep:
+            self.dropped += 1
+            self.dropped_by_rule[state.index] += 1
+            _messages_filtered.inc()
+        return keep
+
+    def summary(self) -> List[str]:
+        """The number of messages dropped by each rule, for display"""
+        return [
+            f"{rule.describe()}: {dropped} dropped"
+            for rule, dropped in zip(self.rules, self.dropped_by_rule)
+        ]
@@ -1,27 +1,93 @@
 from __future__ import annotations
-from typing import Dict, List, Optional
-import collections
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import itertools
+import math
+import threading
+import time
 from dataclasses import dataclass, field
-from datetime import datetime
 
 from PySide6 import QtCore
 from PySide6.QtCore import Qt
 
-from common import consts
-
-
-MqHistoricalPayload = collections.namedtuple("MqHistoricalPayload", ["payload", "timestamp"])
-
-
-@dataclass
+from common import consts, metrics
+from models.ingestqueue import MqIncomingMessage, MqIngestQueue
+from models.ingestrules import MqIngestFilter, MqIngestRule
+from models.mqttlistener import MqttListener, default_subscriptions
+from models.numerichistory import MqNumericHistory
+from models.payloadhistory import (
+    MqHistoryBudget,
+    MqHistoryLimits,
+    MqPayloadHistory,
+    cached_payload_text,
+    history_from_json,
+    history_to_json,
+)
+
+
+_messages_applied = metrics.registry.counter(
+    "messages_applied_total", "Messages applied to the tree"
+)
+_tree_update_time = metrics.registry.histogram(
+    "tree_update_seconds", "Time to apply a batch of messages to the tree, without model signals"
+)
+_model_signals_time = metrics.registry.histogram(
+    "model_signals_seconds",
+    "Time to emit the model signals of a batch, including their handling by the views",
+)
+
+# Message rates are exponentially weighted moving averages over these windows, in seconds.
+# Like the load average, they are updated once per tick from the messages counted during it,
+# so the per message cost is an addition. A constant rate of r msgs/s converges to r.
+RATE_WINDOWS = (1.0, 10.0, 60.0)
+RATE_TICK = 1.0
+RATE_DISPLAY_WINDOW = 1  # Index of the window shown in the rate column
+# Displayed rates below this are shown as empty
+RATE_MIN_DISPLAYED = 0.05
+_ZERO_RATES = (0.0,) * len(RATE_WINDOWS)
+_RATE_DECAYS = tuple(math.exp(-RATE_TICK / window) for window in RATE_WINDOWS)
+
+RATE_COLUMN = 4
+COLUMN_HEADERS = ("Topic", "Payload", "Subtopics", "Messages", "Rate")
+
+# Views query the flags of every row they lay out
+_ITEM_FLAGS = Qt.ItemFlag.ItemIsEnabled | Qt.ItemIsSelectable
+
+
+def rate_tick(now: Optional[float] = None) -> int:
+    """The rate tick of now, in time.monotonic() seconds"""
+    return int((time.monotonic() if now is None else now) / RATE_TICK)
+
+
+# Nodes compare by identity: the generated __eq__ would compare whole subtrees
+@dataclass(eq=False)
 class MqTreeNode:
     topic_fragment: str
-    payload: str
-    payload_history: List[MqHistoricalPayload] = field(default_factory=list)
+    payload: bytes  # Raw, see payload_text
+    payload_history: MqPayloadHistory = field(default_factory=MqPayloadHistory)
 
     _parent: Optional[MqTreeNode] = field(default=None, repr=False)
     _children: List[MqTreeNode] = field(default_factory=list)
     _children_map: Dict[str, MqTreeNode] = field(default_factory=dict, repr=False)
+    # Position in the parent's _children, must be kept in sync whenever children are reordered
+    _row: int = field(default=0, repr=False)
+
+    # Cached subtree counters, kept up to date incrementally so painting a cell never walks
+    # the subtree. Descendant and leaf counts exclude the node itself, the message count
+    # includes its own history.
+    _descendant_count: int = field(default=0, repr=False)
+    _leaf_count: int = field(default=0, repr=False)
+    _direct_leaf_count: int = field(default=0, repr=False)
+    _message_count: int = field(default=0, repr=False)
+    # Rates of the messages received by the node and its descendants before tick _rate_tick,
+    # and the number of messages received during it. See RATE_WINDOWS.
+    _rates: tuple = field(default=_ZERO_RATES, repr=False)
+    _rate_tick: int = field(default=0, repr=False)
+    _tick_count: int = field(default=0, repr=False)
+    # Numeric columns of the history, built when first needed, see numeric_history
+    _numeric_history: Optional[MqNumericHistory] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self._message_count = len(self.payload_history)
 
     def full_topic(self):
         node = self
@@ -32,13 +98,45 @@ class MqTreeNode:
         return "/".join(frags[:-1][::-1])  # Skip root
 
     def child_count(self, leaves=False) -> int:
-        return sum(1 for c in self._children if c.payload) if leaves else len(self._children)
+        return self._direct_leaf_count if leaves else len(self._children)
 
     def recursive_child_count(self, leaves=False) -> int:
-        return self.child_count(leaves) + sum(c.recursive_child_count(leaves) for c in self._children)
+        return self._leaf_count if leaves else self._descendant_count
 
     def recursive_message_count(self) -> int:
-        return len(self.payload_history) + sum(c.recursive_message_count() for c in self._children)
+        return self._message_count
+
+    def loaded_children(self) -> List[MqTreeNode]:
+        """The children that have been created, without loading any from a session file"""
+        return self._children
+
+    def add_to_rates(self, count: int, tick: int):
+        """Count messages received during tick by the subtree. Unlike the other counters, the
+        rates of the ancestors aren't updated, see MqTreeModel.apply_messages."""
+        if self._rate_tick != tick:
+            self._rates = self._rates_at(tick)
+            self._rate_tick = tick
+            self._tick_count = 0
+        self._tick_count += count
+
+    def rates(self, tick: Optional[int] = None) -> List[float]:
+        """Messages per second received by the subtree before tick, one rate per window"""
+        return list(self._rates_at(rate_tick() if tick is None else tick))
+
+    def rate(self, tick: Optional[int] = None) -> float:
+        """The rate shown in the rate column, see RATE_DISPLAY_WINDOW"""
+        return self._rates_at(rate_tick() if tick is None else tick)[RATE_DISPLAY_WINDOW]
+
+    def _rates_at(self, tick: int) -> tuple:
+        if tick == self._rate_tick or (self._rates is _ZERO_RATES and not self._tick_count):
+            return self._rates
+
+        tick_rate = self._tick_count / RATE_TICK
+        idle_ticks = tick - self._rate_tick - 1
+        return tuple(
+            (rate * decay + tick_rate * (1 - decay)) * decay**idle_ticks
+            for rate, decay in zip(self._rates, _RATE_DECAYS)
+        )
 
     def child(self, row: int) -> Optional[MqTreeNode]:
         if row >= 0 and row < self.child_count():
@@ -47,15 +145,79 @@ class MqTreeNode:
 
     def append_child(self, child: MqTreeNode):
         child._parent = self
+        child._row = len(self._children)
         self._children.append(child)
         self._children_map[child.topic_fragment] = child
+
+        is_leaf = int(bool(child.payload))
+        self._direct_leaf_count += is_leaf
+        self._add_to_counters(
+            child._descendant_count + 1, child._leaf_count + is_leaf, child._message_count
+        )
         return child
 
+    def payload_text(self) -> str:
+        return cached_payload_text(self.payload)
+
+    def update_payload(self, payload: bytes, timestamp: float) -> bool:
+        if self.payload == payload:  # Don't add to history if the payload hasn't changed
+            return False
+
+        leaf_delta = int(bool(payload)) - int(bool(self.payload))
+        # Appending may evict older entries to keep the history within its limits
+        message_delta = 1 - self.payload_history.append(payload, timestamp)
+        self.payload = payload
+
+        self._message_count += message_delta
+        if self._parent:
+            self._parent._direct_leaf_count += leaf_delta
+            self._parent._add_to_counters(0, leaf_delta, message_delta)
+        return True
+
+    def numeric_history(self) -> MqNumericHistory:
+        """The history parsed as numbers, brought up to date. Only the entries appended since
+        the last call are parsed."""
+        if self._numeric_history is None:
+            history = self.payload_history
+            self._numeric_history = MqNumericHistory(history, budget=history.budget)
+        self._numeric_history.update()
+        return self._numeric_history
+
+    def load_history(self) -> int:
+        """Read the history of a node from a lazily loaded session, within the per-topic
+        limits. Returns the number of evicted entries."""
+        evicted = self.payload_history.load()
+        self._history_evicted(evicted)
+        return evicted
+
+    def trim_history(self) -> int:
+        """Evict all history except for the latest entry, returns the number of evicted entries"""
+        evicted = self.payload_history.evict(len(self.payload_history))
+        if self._numeric_history is not None:  # Cold node, free its points too
+            self._numeric_history.release()
+            self._numeric_history = None
+        self._history_evicted(evicted)
+        return evicted
+
+    def _history_evicted(self, evicted: int):
+        if evicted:
+            self._message_count -= evicted
+            if self._parent:
+                self._parent._add_to_counters(0, 0, -evicted)
+
+    def _add_to_counters(self, descendants: int, leaves: int, messages: int):
+        node = self
+        while node:
+            node._descendant_count += descendants
+            node._leaf_count += leaves
+            node._message_count += messages
+            node = node._parent
+
     def data(self, column: int):
         if column == 0:
             return self.topic_fragment
         elif column == 1:
-            return self.payload
+            return self.payload_text()
         elif column == 2:
             recursive = self.recursive_child_count(leaves=True)
             direct = self.child_count(leaves=True)
@@ -64,54 +226,71 @@ class MqTreeNode:
             recursive = self.recursive_message_count()
             direct = len(self.payload_history)
             return self._format_recursive_direct(recursive, direct)
+        elif column == RATE_COLUMN:
+            return self._format_rate(self.rate())
 
     def parent(self):
         return self._parent
 
     def row(self) -> int:
-        if self._parent:
-            return self._parent._children.index(self)
         # The root is always row 0
-        return 0
+        return self._row
+
+    def _reindex_children(self, start: int = 0):
+        for row in range(start, len(self._children)):
+            self._children[row]._row = row
 
     def find_child(self, topic_frag: str):
         return self._children_map.get(topic_frag)
 
     def asdict(self):
-        return {
+        entries, binary = history_to_json(self.payload_history.raw_entries())
+        node_dict = {
             consts.SESSION_TOPIC_FRAGMENT_KEY: self.topic_fragment,
-            consts.SESSION_HISTORY_KEY: [
-                MqHistoricalPayload(payload, timestamp.timestamp())
-                for (payload, timestamp) in self.payload_history
-            ],
+            consts.SESSION_HISTORY_KEY: entries,
             consts.SESSION_CHILDREN_KEY: [child.asdict() for child in self._children],
         }
+        if binary:
+            node_dict[consts.SESSION_BINARY_KEY] = binary
+        return node_dict
 
     @staticmethod
-    def parse(node_dict: dict) -> MqTreeNode:
+    def parse(node_dict: dict, budget: Optional[MqHistoryBudget] = None) -> MqTreeNode:
         topic = node_dict[consts.SESSION_TOPIC_FRAGMENT_KEY]
-        payload = ""
 
-        # Convert timestamps to Python representation
-        for hist_item in node_dict[consts.SESSION_HISTORY_KEY]:
-            hist_item[1] = datetime.fromtimestamp(hist_item[1])
-
-        history = [MqHistoricalPayload(*pl) for pl in node_dict[consts.SESSION_HISTORY_KEY]]
-        if history:
-            payload = history[-1].payload
+        payloads, timestamps = history_from_json(
+            node_dict[consts.SESSION_HISTORY_KEY], node_dict.get(consts.SESSION_BINARY_KEY, ())
+        )
+        history = MqPayloadHistory(budget)
+        history.extend(payloads, timestamps)
+        payload = payloads[-1] if payloads else b""
 
         # Reconstitute node
         node = MqTreeNode(topic, payload, history)
-        node._children = [
-            MqTreeNode.parse(child) for child in node_dict[consts.SESSION_CHILDREN_KEY]
-        ]
-        node._children_map = {child.topic_fragment: child for child in node._children}
+        node.adopt_children(
+            [MqTreeNode.parse(child, budget) for child in node_dict[consts.SESSION_CHILDREN_KEY]]
+        )
+        return node
 
-        # Reconnect children
-        for child in node._children:
-            child._parent = node
+    def adopt_children(self, children: List[MqTreeNode]):
+        """Set the children of a node that has none yet, e.g. while restoring a session.
 
-        return node
+        Unlike append_child, this doesn't update the counters of the ancestors, so restored
+        trees must be built bottom-up.
+        """
+        self._children = children
+        self._children_map = {child.topic_fragment: child for child in children}
+        self._reindex_children()
+
+        # Reconnect children and sum up their counters
+        for child in children:
+            child._parent = self
+
+            is_leaf = int(bool(child.payload))
+            self._direct_leaf_count += is_leaf
+            self._descendant_count += child._descendant_count + 1
+            self._leaf_count += child._leaf_count + is_leaf
+            self._message_count += child._message_count
 
     @staticmethod
     def _format_recursive_direct(recursive: int, direct: int) -> Optional[str]:
@@ -121,33 +300,141 @@ class MqTreeNode:
             return f"{recursive}"
         return None
 
+    @staticmethod
+    def _format_rate(rate: float) -> Optional[str]:
+        if rate < RATE_MIN_DISPLAYED:
+            return None
+        if rate >= 100:
+            return f"{rate:.0f}/s"
+        return f"{rate:.1f}/s"
+
+
+# Lazy nodes can be expanded from the GUI thread while the session save thread walks the tree
+_load_children_lock = threading.Lock()
+
+
+class MqLazyTreeNode(MqTreeNode):
+    """Node restored from a session file whose children are only read when first accessed.
+
+    The subtree counters are restored with the node, so it can be displayed without reading
+    anything below it. load_children returns the children, which must not be connected to
+    the node yet.
+    """
+
+    def __init__(
+        self,
+        topic_fragment: str,
+        payload: bytes,
+        payload_history: MqPayloadHistory,
+        *,
+        child_count: int,
+        descendant_count: int,
+        leaf_count: int,
+        direct_leaf_count: int,
+        message_count: int,
+        load_children: Callable[[], List[MqTreeNode]],
+    ):
+        super().__init__(topic_fragment, payload, payload_history)
+        self._descendant_count = descendant_count
+        self._leaf_count = leaf_count
+        self._direct_leaf_count = direct_leaf_count
+        self._message_count = message_count
+
+        # Accessing the unset children attributes loads them (see __getattr__)
+        del self._children
+        del self._children_map
+        self._unloaded_child_count = child_count
+        self._load_children = load_children
+
+    def __getattr__(self, name):
+        # Only called for unset attributes
+        if name not in ("_children", "_children_map"):
+            raise AttributeError(name)
+
+        with _load_children_lock:
+            # Unless another thread loaded them meanwhile, which would orphan its nodes
+            if self._load_children:
+                children = self._load_children()
+                for row, child in enumerate(children):
+                    child._parent = self
+                    child._row = row
+                self._children_map = {child.topic_fragment: child for child in children}
+                self._children = children
+                # Last, readers checking _load_children without the lock then find them set
+                self._load_children = None
+        return object.__getattribute__(self, name)
+
+    def child_count(self, leaves=False) -> int:
+        if self._load_children and not leaves:
+            return self._unloaded_child_count
+        return super().child_count(leaves)
+
+    def loaded_children(self) -> List[MqTreeNode]:
+        return [] if self._load_children else self._children
+
 
 class MqTreeModel(QtCore.QAbstractItemModel):
-    # Emitted whenever a message is received on a node through an active MQTT listener
-    messageReceived = QtCore.Signal(MqTreeNode)
+    # Emitted once per processed batch with the list of nodes that received messages
+    messagesReceived = QtCore.Signal(list)
 
     def __init__(
         self,
         parent=None,
         *,
         mqtt_listener: Optional[MqttListener] = None,
-        saved_state: Optional[dict] = None,
+        session=None,
+        batch_interval_ms: int = consts.DEFAULT_BATCH_INTERVAL_MS,
+        queue_size: int = consts.DEFAULT_INGEST_QUEUE_SIZE,
+        history_limits: Optional[MqHistoryLimits] = None,
+        ingest_rules: Sequence[MqIngestRule] = (),
     ):
         super().__init__(parent)
 
         self._entries = {}
-        if saved_state:
-            self._root_item = MqTreeNode.parse(saved_state)
+        self._history_budget = MqHistoryBudget(history_limits)
+        if session:  # A JsonSession or BinarySession from models.session
+            self._root_item = session.build_tree(self._history_budget)
+            if not session.lazy:  # Lazy histories enter the budget as they are read
+                self._track_restored_history()
         else:
-            self._root_item = MqTreeNode("", "")
+            self._root_item = self._new_node("")
+
+        # Messages are queued on the MQTT network thread and applied in batches on the GUI thread
+        self._queue = MqIngestQueue(queue_size)
+        self._ingest_filter = MqIngestFilter(ingest_rules)
+        # Messages are received on the network thread and on the replay thread at once
+        self._receive_lock = threading.Lock()
+        self._batch_timer = QtCore.QTimer(self)
+        self._batch_timer.setInterval(batch_interval_ms)
+        # Half of each interval is left to the GUI when messages are backing up
+        self._batch_time_budget = batch_interval_ms / 2000
+        self._batch_timer.timeout.connect(self._process_pending_batch)
+        self._batch_timer.start()
 
         self._mqtt = mqtt_listener
         if self._mqtt:
-            self._mqtt.add_connect_listener(self.on_connect)
             self._mqtt.add_message_listener(self.on_message)
 
+        queue = self._queue
+        budget = self._history_budget
+        metrics.registry.gauge(
+            "ingest_queue_length", "Messages waiting to be applied to the tree", queue.__len__
+        )
+        metrics.registry.read_counter(
+            "messages_dropped_total",
+            "Messages dropped because the ingestion queue was full",
+            lambda: queue.dropped,
+        )
+        metrics.registry.gauge("history_bytes", "Memory used by history", lambda: budget.nbytes)
+        metrics.registry.gauge("history_entries", "Stored history entries", lambda: budget.entries)
+        metrics.registry.read_counter(
+            "history_evicted_total",
+            "History entries evicted to stay within the limits",
+            lambda: budget.evicted,
+        )
+
     def columnCount(self, _parent=QtCore.QModelIndex()):
-        return 4
+        return len(COLUMN_HEADERS)
 
     def rowCount(self, parent=QtCore.QModelIndex()):
         if parent.column() > 0:
@@ -158,25 +445,23 @@ class MqTreeModel(QtCore.QAbstractItemModel):
         return parent.internalPointer().child_count()
 
     def headerData(self, section, orientation, role):
-        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
-            if section == 0:
-                return "Topic"
-            if section == 1:
-                return "Payload"
-            if section == 2:
-                return "Subtopics"
-            if section == 3:
-                return "Messages"
+        if orientation != QtCore.Qt.Horizontal:
+            return None
+        if role == QtCore.Qt.DisplayRole and 0 <= section < len(COLUMN_HEADERS):
+            return COLUMN_HEADERS[section]
+        elif role == QtCore.Qt.ToolTipRole and section == RATE_COLUMN:
+            window = RATE_WINDOWS[RATE_DISPLAY_WINDOW]
+            return f"Messages per second in the subtree, averaged over about {window:.0f} s"
         return None
 
     def flags(self, index: QtCore.QModelIndex) -> Qt.ItemFlags:
         if not index.isValid():
             return Qt.ItemFlag.NoItemFlags
 
-        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemIsSelectable
+        return _ITEM_FLAGS
 
     def index(self, row, column, parent=QtCore.QModelIndex()):
-        if column > 3:
+        if column >= len(COLUMN_HEADERS):
             return QtCore.QModelIndex()
 
         if not parent.isValid():
@@ -195,8 +480,8 @@ class MqTreeModel(QtCore.QAbstractItemModel):
         if not model.parent():
             return QtCore.QModelIndex()
 
-        parent_index = self.index_for_model(model.parent())
-        return self.index(model.row(), 0, parent_index)
+        # Nodes know their own row, so there is no need to walk down from the root
+        return self.createIndex(model.row(), 0, model)
 
     def data(self, index, role):
         if not index.isValid():
@@ -208,6 +493,10 @@ class MqTreeModel(QtCore.QAbstractItemModel):
             return item.data(index.column())
         elif role == consts.FULL_TOPIC_ROLE:
             return item.full_topic()
+        elif role == QtCore.Qt.ToolTipRole and index.column() == RATE_COLUMN:
+            return ", ".join(
+                f"{window:.0f} s: {rate:.2f}/s" for window, rate in zip(RATE_WINDOWS, item.rates())
+            )
 
     def parent(self, index):
         if not index.isValid():
@@ -216,11 +505,21 @@ class MqTreeModel(QtCore.QAbstractItemModel):
         childItem: MqTreeNode = index.internalPointer()
         parentItem = childItem.parent()
 
-        if parentItem == self._root_item:
+        if parentItem is self._root_item:
             return QtCore.QModelIndex()
 
         return self.createIndex(parentItem.row(), 0, parentItem)
 
+    def root(self) -> MqTreeNode:
+        return self._root_item
+
+    def pause_ingestion(self):
+        """Stop applying received messages to the tree, they stay queued until resumed"""
+        self._batch_timer.stop()
+
+    def resume_ingestion(self):
+        self._batch_timer.start()
+
     def has_mqtt(self):
         return self._mqtt is not None
 
@@ -229,69 +528,271 @@ class MqTreeModel(QtCore.QAbstractItemModel):
             topic, payload=payload, qos=qos, retain=retain, properties=properties
         )
 
-    def on_connect(self, client, _userdata, _flags, _rc):
-        client.subscribe("#")
+    def mqtt_subscriptions(self) -> Dict[str, int]:
+        return self._mqtt.subscriptions
+
+    def mqtt_subscribe(self, topic: str, qos: int = 0):
+        self._mqtt.subscribe(topic, qos)
+
+    def mqtt_unsubscribe(self, topic: str):
+        self._mqtt.unsubscribe(topic)
 
     def find_node(self, topic_path: List[str]) -> (MqTreeNode, List[str]):
         node = self._root_item
-        nextNode = self._root_item
-        while nextNode and topic_path:
-            nextNode = nextNode.find_child(topic_path[0])
-            if nextNode:
-                topic_path = topic_path[1:]
-                node = nextNode
-        return (node, topic_path)
+        for depth, frag in enumerate(topic_path):
+            next_node = node.find_child(frag)
+            if not next_node:
+                return (node, topic_path[depth:])
+            node = next_node
+        return (node, [])
+
+    @property
+    def ingest_queue(self) -> MqIngestQueue:
+        return self._queue
+
+    def dropped_messages(self) -> int:
+        return self._queue.dropped
+
+    @property
+    def ingest_filter(self) -> MqIngestFilter:
+        return self._ingest_filter
 
     def on_message(self, _client, _userdata, msg):
-        path = msg.topic.split("/")
-        node, remain = self.find_node(path)
-
-        if remain:
-            # Find index for deepest existing node in this subtree
-            parent_index = self.index_for_model(node)
-            # This could be more specific for slightly better performance
-            self.layoutAboutToBeChanged.emit()
-
-            for frag in remain:
-                idx = node.child_count()
-                self.beginInsertRows(parent_index, idx, idx)
-                node = node.append_child(MqTreeNode(frag, ""))
-                self.endInsertRows()
-                parent_index = self.index(idx, 0, parent_index)
-
-        payload = self.decode_payload(msg.payload)
-        if node.payload != payload:  # Don't add to history if the payload hasn't changed
-            node.payload_history.append(MqHistoricalPayload(payload, datetime.now()))
-            node.payload = payload
-
-        if remain:
-            self.layoutChanged.emit()  # Again, could be more specific
-        else:
-            base_index = self.index_for_model(node)
-            self.dataChanged.emit(base_index.siblingAtColumn(1), base_index.siblingAtColumn(3))
+        # Runs on the MQTT network thread or the replay thread, so only filter and queue the
+        # message here. The filter's state and metrics must only be updated by one of them
+        # at a time.
+        timestamp = time.time()
+        with self._receive_lock:
+            if self._ingest_filter and not self._ingest_filter.accept(msg.topic, timestamp):
+                return
+            self._queue.put(MqIncomingMessage(msg.topic, msg.payload, timestamp))
+
+    def process_pending(self, time_budget: Optional[float] = None):
+        """Apply the queued messages. With a time budget, in seconds, they are applied in chunks
+        until it is spent and the rest stays queued for the next call, so a backlog doesn't
+        freeze the GUI."""
+        if time_budget is None:
+            messages = self._queue.drain()
+            if messages:
+                self.apply_messages(messages)
+            return
+
+        deadline = time.perf_counter() + time_budget
+        while time.perf_counter() < deadline:
+            messages = self._queue.drain(consts.INGEST_CHUNK_SIZE)
+            if not messages:
+                break
+            self.apply_messages(messages)
+
+    def _process_pending_batch(self):
+        self.process_pending(self._batch_time_budget)
+
+    def apply_messages(self, messages: Iterable[MqIncomingMessage]):
+        start = time.perf_counter()
+
+        # Subtrees for new topics are built detached from the tree and grouped by the existing
+        # node they will be appended to, so each parent gets a single contiguous row insertion
+        new_subtrees: Dict[MqTreeNode, Dict[str, MqTreeNode]] = {}
+        resolved = [
+            (self._find_or_create_node(topic.split("/"), new_subtrees), payload, timestamp)
+            for topic, payload, timestamp in messages
+        ]
 
-            # Update column 3 (messages) for ancestors
-            parent = node.parent()
-            while parent:
-                p_idx = self.index_for_model(parent)
-                if p_idx.isValid():
-                    self.dataChanged.emit(p_idx.siblingAtColumn(3), p_idx.siblingAtColumn(3))
-                parent = parent.parent()
+        # Insert the new rows before touching any payloads. QSortFilterProxyModel drops inserted
+        # rows if existing rows have changed data it hasn't been notified about yet.
+        signals_start = time.perf_counter()
+        for parent, children in new_subtrees.items():
+            first = parent.child_count()
+            self.beginInsertRows(
+                self.index_for_model(parent), first, first + len(children) - 1
+            )
+            for child in children.values():
+                parent.append_child(child)
+            self.endInsertRows()
+        signals_time = time.perf_counter() - signals_start
+
+        # Nodes that received messages in this batch, in arrival order, with their message count
+        updated: Dict[MqTreeNode, int] = {}
+        for node, payload, timestamp in resolved:
+            node.update_payload(payload, timestamp)
+            updated[node] = updated.get(node, 0) + 1
+
+        # The message counts are summed up the tree one level at a time, so shared ancestors
+        # are only updated once per level
+        tick = rate_tick()
+        counts = updated
+        while counts:
+            parent_counts = {}
+            for node, count in counts.items():
+                node.add_to_rates(count, tick)
+                parent = node._parent
+                if parent:
+                    parent_counts[parent] = parent_counts.get(parent, 0) + count
+            counts = parent_counts
+
+        budget = self._history_budget
+        for node in updated:
+            if len(node.payload_history) > 1:
+                budget.touch(node)
+        trimmed = budget.enforce()  # Cold topics only lose history, their counters change
+
+        signals_start = time.perf_counter()
+        self._emit_batch_data_changed(itertools.chain(updated, trimmed))
+        self.messagesReceived.emit(list(updated))
+        end = time.perf_counter()
+        signals_time += end - signals_start
+
+        _messages_applied.inc(len(resolved))
+        _tree_update_time.observe(end - start - signals_time)
+        _model_signals_time.observe(signals_time)
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        """Reorder the children of every loaded node in place.
+
+        This is much faster than sorting in a QSortFilterProxyModel, which compares the
+        display data of every pair of rows. The order is a snapshot: rows inserted later are
+        appended, and the rates keep changing after the sort.
+        """
+        tick = rate_tick()
+        key = {
+            0: lambda node: node.topic_fragment.casefold(),
+            1: lambda node: node.payload,
+            2: lambda node: node._leaf_count,
+            3: lambda node: node._message_count,
+            RATE_COLUMN: lambda node: node.rate(tick),
+        }.get(column)
+        if not key:
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        persistent_nodes = [(index.internalPointer(), index.column()) for index in persistent]
+
+        stack = [self._root_item]
+        while stack:
+            node = stack.pop()
+            children = node.loaded_children()
+            if len(children) > 1:
+                # Sorting in place keeps _children_map valid
+                children.sort(key=key, reverse=order == Qt.DescendingOrder)
+                node._reindex_children()
+            stack.extend(children)
+
+        self.changePersistentIndexList(
+            persistent,
+            [self.createIndex(node.row(), column, node) for node, column in persistent_nodes],
+        )
+        self.layoutChanged.emit()
+
+    @property
+    def history_budget(self) -> MqHistoryBudget:
+        return self._history_budget
+
+    def touch(self, node: MqTreeNode):
+        """Mark a node as recently viewed, so its history is evicted last.
+
+        The history of a node from a lazily loaded session is read, within the limits, so
+        it should be touched before its history is shown.
+        """
+        changed = [node] if node.load_history() else []
+        if len(node.payload_history) > 1:
+            self._history_budget.touch(node)
+            changed.extend(self._history_budget.enforce())
+        self._emit_batch_data_changed(changed)
+
+    def _track_restored_history(self):
+        # Restored nodes enter the LRU ordered by their last update
+        nodes = []
+        stack = [self._root_item]
+        while stack:
+            node = stack.pop()
+            stack.extend(node._children)
+            if len(node.payload_history) > 1:
+                nodes.append(node)
+
+        nodes.sort(key=lambda node: node.payload_history.timestamp(-1))
+        for node in nodes:
+            self._history_budget.touch(node)
+        self._history_budget.enforce()
+
+    def _find_or_create_node(
+        self, topic_path: List[str], new_subtrees: Dict[MqTreeNode, Dict[str, MqTreeNode]]
+    ) -> MqTreeNode:
+        node, remain = self.find_node(topic_path)
+        if not remain:
+            return node
+
+        # The topic may have been created earlier in this batch, below a detached subtree root
+        detached = new_subtrees.setdefault(node, {})
+        node = detached.get(remain[0])
+        if not node:
+            node = detached[remain[0]] = self._new_node(remain[0])
+
+        # Nodes below a detached subtree root aren't visible to the views yet
+        for frag in remain[1:]:
+            node = node.find_child(frag) or node.append_child(self._new_node(frag))
+        return node
 
-        self.messageReceived.emit(node)  # Emit the signal with the updated node
+    def _new_node(self, topic_fragment: str) -> MqTreeNode:
+        return MqTreeNode(topic_fragment, b"", MqPayloadHistory(self._history_budget))
+
+    def _emit_batch_data_changed(self, nodes: Iterable[MqTreeNode]):
+        # Repeated updates to the same node or to shared ancestors are coalesced into one
+        # contiguous dataChanged range per parent
+        changed_rows = {}  # parent -> (first row, last row, first column)
+        for node in nodes:
+            first_column = 1
+            while node.parent():
+                parent = node.parent()
+                row = node.row()
+                entry = changed_rows.get(parent)
+                if entry:
+                    first, last, column = entry
+                    if first <= row <= last and column <= first_column:
+                        break  # The rest of the ancestors have already been covered
+                    changed_rows[parent] = (
+                        min(first, row),
+                        max(last, row),
+                        min(column, first_column),
+                    )
+                else:
+                    changed_rows[parent] = (row, row, first_column)
+
+                # Only the counters change for ancestors
+                first_column = 2
+                node = parent
+
+        for parent, (first, last, column) in changed_rows.items():
+            parent_index = self.index_for_model(parent)
+            self.dataChanged.emit(
+                self.index(first, column, parent_index),
+                self.index(last, len(COLUMN_HEADERS) - 1, parent_index),
+            )
 
     def _serialize_state(self) -> dict:
         return self._root_item.asdict()
 
+    def session_config(self) -> dict:
+        if self._mqtt:
+            return self._mqtt.to_config()
+        return {
+            "host": "",
+            "port": 1883,
+            "username": None,
+            "password": None,
+            "subscriptions": default_subscriptions(),
+        }
+
     def serialize(self) -> dict:
         return {
-            "config": self._mqtt.to_config(),
+            "config": self.session_config(),
             "state": self._serialize_state(),
         }
 
-    @staticmethod
-    def decode_payload(payload: bytes):
-        try:
-            return payload.decode("UTF-8")
-        except UnicodeDecodeError:
-            return repr(payload)
+
+class MqTreeProxyModel(QtCore.QSortFilterProxyModel):
+    """Filters the topic tree, sorting is delegated to MqTreeModel.sort"""
+
+    def sort(self, column: int, order=Qt.AscendingOrder):
+        # The proxy itself stays unsorted, so it keeps the source order
+        self.sourceModel().sort(column, order)
@@ -1,10 +1,65 @@
 from __future__ import annotations
 import dataclasses
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+import threading
 
 import paho.mqtt.client as mqtt
 
+from common import consts, metrics
+
+
+_messages_received = metrics.registry.counter(
+    "messages_received_total", "Messages received from the broker"
+)
+_message_callback_time = metrics.registry.histogram(
+    "message_callback_seconds", "Time the MQTT network thread spends handling each message"
+)
+
+
+def default_subscriptions() -> Dict[str, int]:
+    return {consts.DEFAULT_SUBSCRIPTION: 0}
+
+
+def parse_subscription(text: str) -> Tuple[str, int]:
+    """Parse a subscription given as TOPIC[:QOS], e.g. "sensors/+/temperature:1".
+
+    Raises ValueError if the topic filter isn't valid.
+    """
+    topic, qos = text, 0
+    prefix, separator, suffix = text.rpartition(":")
+    if separator and suffix in ("0", "1", "2"):
+        topic, qos = prefix, int(suffix)
+
+    validate_topic_filter(topic)
+    return topic, qos
+
+
+def format_subscription(topic: str, qos: int) -> str:
+    """The inverse of parse_subscription"""
+    # A topic ending like a QoS suffix needs an explicit one
+    if qos or topic[-2:] in (":0", ":1", ":2"):
+        return f"{topic}:{qos}"
+    return topic
+
+
+def validate_topic_filter(topic: str):
+    """Raises ValueError if topic isn't a valid MQTT topic filter"""
+    if not topic:
+        raise ValueError("The topic filter is empty")
+
+    levels = topic.split("/")
+    for depth, level in enumerate(levels):
+        if "#" in level and (level != "#" or depth != len(levels) - 1):
+            raise ValueError(f"# must be the last level of a topic filter: {topic}")
+        if "+" in level and level != "+":
+            raise ValueError(f"+ must be a whole level of a topic filter: {topic}")
+
+
+def parse_subscriptions(lines: Iterable[str]) -> Dict[str, int]:
+    """Parse subscriptions as TOPIC[:QOS] into topic filter -> QoS, skipping empty lines"""
+    return dict(parse_subscription(line.strip()) for line in lines if line.strip())
+
 
 @dataclass
 class MqttListenerConfiguration:
@@ -14,16 +69,30 @@ class MqttListenerConfiguration:
     username: Optional[str] = None
     password: Optional[str] = None
 
+    # Topic filter -> QoS
+    subscriptions: Dict[str, int] = field(default_factory=default_subscriptions)
+
 
 class MqttListener:
     def __init__(
-        self, host, port=1883, username: Optional[str] = None, password: Optional[str] = None
+        self,
+        host,
+        port=1883,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        subscriptions: Optional[Dict[str, int]] = None,
     ):
         self._mqtt = mqtt.Client()
         self._host = host
         self._port = port
         self._username = username
         self._password = password
+        # Topic filter -> QoS, subscribed on every (re)connect. Changed from the GUI thread
+        # and read on the network thread.
+        if subscriptions is None:
+            subscriptions = default_subscriptions()
+        self._subscriptions = dict(subscriptions)
+        self._subscriptions_lock = threading.Lock()
 
         self._connect_listeners = []
         self._connect_fail_listeners = []
@@ -43,8 +112,28 @@ class MqttListener:
             "port": self._port,
             "username": self._username,
             "password": self._password,
+            "subscriptions": self.subscriptions,
         }
 
+    @property
+    def subscriptions(self) -> Dict[str, int]:
+        with self._subscriptions_lock:
+            return dict(self._subscriptions)
+
+    def subscribe(self, topic: str, qos: int = 0):
+        """Add a subscription, or change its QoS. Takes effect immediately when connected."""
+        validate_topic_filter(topic)
+        with self._subscriptions_lock:
+            self._subscriptions[topic] = qos
+        # Fails harmlessly when not connected, all subscriptions are sent on connect
+        self._mqtt.subscribe(topic, qos)
+
+    def unsubscribe(self, topic: str):
+        with self._subscriptions_lock:
+            if self._subscriptions.pop(topic, None) is None:
+                return
+        self._mqtt.unsubscribe(topic)
+
     def connect(self):
         self._mqtt.on_connect = self._connect_listener
         self._mqtt.on_message = self._message_listener
@@ -78,7 +167,9 @@ class MqttListener:
                 listener(client)
             return
 
-        client.subscribe("#")  # Subscribe to all topics
+        subscriptions = list(self.subscriptions.items())
+        if subscriptions:  # paho rejects an empty list
+            client.subscribe(subscriptions)
         for listener in self._connect_listeners:  # Notify all other listeners
             listener(client, userdata, flags, rc)
 
@@ -87,5 +178,7 @@ class MqttListener:
             listener(*args)
 
     def _message_listener(self, *args):
-        for listener in self._message_listeners:  # Notify all other listeners
-            listener(*args)
\ No newline at end of file
+        with _message_callback_time.time():
+            for listener in self._message_listeners:  # Notify all other listeners
+                listener(*args)
+        _messages_received.inc()
\ No newline at end of file
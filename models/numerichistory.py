@@ -0,0 +1,160 @@
+"""Numeric interpretation of payload histories, as NumPy columns.
+
+Charting a history means parsing its payloads as numbers, which costs seconds on long
+histories. The parsed points are kept per node and extended as entries are appended, so a
+topic is parsed once however often it is selected. The chart draws from the same columns.
+"""
+
+from __future__ import annotations
+from typing import Callable, Optional, Sequence, Tuple
+import math
+
+import numpy as np
+
+from models.payloadhistory import MqHistoryBudget, MqPayloadHistory
+
+
+class MqNumericPoints:
+    """Growable columns of x, y and the absolute history index of each point.
+
+    Appending is amortized O(1) like a list. Evicting points from the front only moves the
+    head, their space is reclaimed when the storage is full and gets reallocated.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._data = np.empty((3, capacity))  # x, y, index rows
+        self._head = 0
+        self._end = 0
+        # Whether x is sorted, it can go back when the clock is adjusted
+        self.x_sorted = True
+
+    def __len__(self) -> int:
+        return self._end - self._head
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._data[0, self._head : self._end]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._data[1, self._head : self._end]
+
+    @property
+    def indexes(self) -> np.ndarray:
+        return self._data[2, self._head : self._end]
+
+    def clear(self):
+        self._head = self._end = 0
+        self.x_sorted = True
+
+    def extend(self, x: Sequence[float], y: Sequence[float], indexes: Sequence[int]):
+        count = len(x)
+        if self._end + count > self._data.shape[1]:
+            length = len(self)
+            capacity = max(self._data.shape[1], 2 * (length + count))
+            data = np.empty((3, capacity))
+            data[:, :length] = self._data[:, self._head : self._end]
+            self._data = data
+            self._head, self._end = 0, length
+
+        if count and self.x_sorted:
+            x = np.asarray(x, dtype=np.float64)
+            self.x_sorted = bool(
+                (not len(self) or self._data[0, self._end - 1] <= x[0])
+                and np.all(x[1:] >= x[:-1])
+            )
+        self._data[0, self._end : self._end + count] = x
+        self._data[1, self._end : self._end + count] = y
+        self._data[2, self._end : self._end + count] = indexes
+        self._end += count
+
+    def evict_before(self, index: int) -> int:
+        """Remove the points of history entries before the absolute index, returns how many"""
+        count = int(np.searchsorted(self._data[2, self._head : self._end], index))
+        self._head += count
+        if self._head == self._end:
+            self.clear()
+        return count
+
+
+def parse_number(payload: bytes) -> float:
+    """The value of a payload that is a number, NaN otherwise"""
+    try:
+        return float(payload)
+    except ValueError:
+        return math.nan
+
+
+class MqNumericHistory:
+    """Points of the entries of a history that have a finite numeric value: their timestamp
+    in epoch milliseconds as x, their value as y, and their absolute history index.
+
+    value gives the value of a payload, NaN if it hasn't one. update() follows the history like
+    MqHistoryModel.refresh(): points of entries evicted from the history are dropped from the
+    front, only the appended entries are parsed. The memory of the points is accounted in
+    budget, release() must be called when they are no longer used.
+    """
+
+    def __init__(
+        self,
+        history: MqPayloadHistory,
+        value: Callable[[bytes], float] = parse_number,
+        budget: Optional[MqHistoryBudget] = None,
+    ):
+        self.history = history
+        self.points = MqNumericPoints()
+        self._value = value
+        self._budget = budget
+        # Absolute indexes of the first entry and of the next entry to parse, as of the last
+        # update. The history may have evicted entries since.
+        self._first = self._end = history.first_index
+        self._nbytes = 0
+        self._account()
+
+    @property
+    def end_index(self) -> int:
+        """Absolute index of the next entry to parse"""
+        return self._end
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Mask of the history entries that have a point, from the first entry as of the last
+        update()"""
+        mask = np.zeros(self._end - self._first, dtype=bool)
+        mask[self.points.indexes.astype(np.int64) - self._first] = True
+        return mask
+
+    def update(self) -> Tuple[int, int]:
+        """Follow the changes of the history, returns the number of points dropped from the
+        front and appended at the back"""
+        history = self.history
+        evicted = self.points.evict_before(history.first_index)
+
+        start = max(self._end, history.first_index)
+        payloads, timestamps = history.raw_columns(start - history.first_index)
+        values = np.fromiter(map(self._value, payloads), dtype=np.float64, count=len(payloads))
+        rows = np.flatnonzero(np.isfinite(values))
+        self.points.extend(
+            np.frombuffer(timestamps, dtype=np.float64)[rows] * 1000, values[rows], rows + start
+        )
+        self._first = history.first_index
+        self._end = history.appended_count
+        self._account()
+        return evicted, len(rows)
+
+    def release(self):
+        """Stop accounting the points in the budget"""
+        if self._budget:
+            self._budget.nbytes -= self._nbytes
+        self._nbytes = 0
+        self._budget = None
+
+    def _account(self):
+        nbytes = self.points.nbytes
+        if self._budget:
+            self._budget.nbytes += nbytes - self._nbytes
+        self._nbytes = nbytes
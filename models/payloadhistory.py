@@ -0,0 +1,326 @@
+from __future__ import annotations
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import array
+import base64
+import collections
+import functools
+import sys
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+from common import consts
+
+
+MqHistoricalPayload = collections.namedtuple("MqHistoricalPayload", ["payload", "timestamp"])
+
+# Approximate memory cost of an entry on top of its payload: the bytes object header,
+# the list slot pointing to it and the timestamp
+ENTRY_OVERHEAD = sys.getsizeof(b"") + 8 + 8
+
+
+# Lazy histories can be read from the GUI thread and the session save thread at once
+_load_lock = threading.Lock()
+
+
+def payload_text(payload: bytes) -> str:
+    """Text shown for a raw payload"""
+    try:
+        return payload.decode("UTF-8")
+    except UnicodeDecodeError:
+        return repr(payload)
+
+
+# Payloads are stored raw and only decoded for display. Views repaint the visible payloads
+# of the tree often, so their text is cached.
+_cached_payload_text = functools.lru_cache(maxsize=consts.PAYLOAD_TEXT_CACHE_SIZE)(payload_text)
+
+
+def cached_payload_text(payload: bytes) -> str:
+    # The cache keeps payloads alive after their history is evicted, outside of the memory
+    # budget, so large payloads are decoded each time instead
+    if len(payload) > consts.PAYLOAD_TEXT_CACHE_MAX_PAYLOAD_SIZE:
+        return payload_text(payload)
+    return _cached_payload_text(payload)
+
+
+def history_to_json(entries: Iterable[Tuple[bytes, float]]) -> Tuple[list, List[int]]:
+    """JSON form of raw history entries: [payload, timestamp] pairs, and the indexes of the
+    payloads that aren't valid UTF-8 and are stored base64 encoded instead"""
+    pairs = []
+    binary = []
+    for index, (payload, timestamp) in enumerate(entries):
+        try:
+            pairs.append([payload.decode("UTF-8"), timestamp])
+        except UnicodeDecodeError:
+            pairs.append([base64.b64encode(payload).decode("ascii"), timestamp])
+            binary.append(index)
+    return pairs, binary
+
+
+def history_from_json(pairs: list, binary: Sequence[int] = ()) -> Tuple[List[bytes], array.array]:
+    """The inverse of history_to_json, returns the raw payloads and the timestamps"""
+    payloads = [payload.encode("UTF-8") for payload, _timestamp in pairs]
+    for index in binary:
+        payloads[index] = base64.b64decode(pairs[index][0])
+    return payloads, array.array("d", [timestamp for _payload, timestamp in pairs])
+
+
+@dataclass
+class MqHistoryLimits:
+    """History caps, 0 means unlimited"""
+
+    max_entries: int = consts.DEFAULT_HISTORY_MAX_ENTRIES  # Per topic
+    max_bytes: int = consts.DEFAULT_HISTORY_MAX_BYTES  # Per topic
+    total_max_entries: int = 0  # Whole tree
+    total_max_bytes: int = consts.DEFAULT_HISTORY_TOTAL_MAX_BYTES  # Whole tree, memory budget
+
+
+class MqHistoryBudget:
+    """Accounting of the history stored in a whole tree, shared by all its histories.
+
+    Nodes are tracked in least recently updated or viewed order. When the tree goes over
+    the global limits, the history of the coldest nodes is evicted first, down to their
+    latest entry so the tree stays navigable.
+    """
+
+    def __init__(self, limits: Optional[MqHistoryLimits] = None):
+        self.limits = limits or MqHistoryLimits()
+        self.entries = 0
+        self.nbytes = 0
+        self.evicted = 0
+        self._lru = collections.OrderedDict()  # Nodes with history, least recently used first
+
+    def exceeded(self) -> bool:
+        limits = self.limits
+        return bool(
+            (limits.total_max_entries and self.entries > limits.total_max_entries)
+            or (limits.total_max_bytes and self.nbytes > limits.total_max_bytes)
+        )
+
+    def touch(self, node):
+        self._lru[node] = None
+        self._lru.move_to_end(node)
+
+    def enforce(self) -> list:
+        """Evict history from the least recently used nodes until within the global limits.
+
+        Returns the nodes whose history was trimmed.
+        """
+        trimmed = []
+        while self._lru and self.exceeded():
+            node, _ = self._lru.popitem(last=False)
+            if node.trim_history():
+                trimmed.append(node)
+        return trimmed
+
+
+class MqPayloadHistory:
+    """Payload history of a single topic.
+
+    Payloads are stored raw next to an array of float epoch timestamps. Entries
+    over the per-topic limits are evicted oldest first. Evicted slots at the front are only
+    reclaimed once they make up half of the storage, which keeps eviction amortized O(1).
+    Indexing returns MqHistoricalPayload tuples of the decoded payload and a datetime.
+    """
+
+    __slots__ = ("_budget", "_timestamps", "_payloads", "_head", "_nbytes", "_appended")
+
+    def __init__(self, budget: Optional[MqHistoryBudget] = None):
+        self._budget = budget
+        self._timestamps = array.array("d")
+        self._payloads = []
+        self._head = 0  # Index of the oldest live entry in the storage
+        self._nbytes = 0
+        self._appended = 0  # Total number of entries ever appended
+
+    def __len__(self) -> int:
+        return len(self._payloads) - self._head
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        index = self._storage_index(index)
+        return MqHistoricalPayload(
+            payload_text(self._payloads[index]), datetime.fromtimestamp(self._timestamps[index])
+        )
+
+    def __iter__(self) -> Iterator[MqHistoricalPayload]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def budget(self) -> Optional[MqHistoryBudget]:
+        return self._budget
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @property
+    def appended_count(self) -> int:
+        return self._appended
+
+    @property
+    def first_index(self) -> int:
+        """Number of entries evicted so far, i.e. the absolute index of the oldest entry"""
+        return self._appended - len(self)
+
+    def timestamp(self, index: int) -> float:
+        return self._timestamps[self._storage_index(index)]
+
+    def raw_entries(self) -> Iterator[Tuple[bytes, float]]:
+        head = self._head
+        return zip(self._payloads[head:], self._timestamps[head:])
+
+    def raw_columns(self, start: int) -> Tuple[List[bytes], array.array]:
+        """Return copies of the raw payloads and the timestamps of the entries from start,
+        loading the history like indexing does"""
+        head = self._head + start
+        return self._payloads[head:], self._timestamps[head:]
+
+    def columns(self) -> Tuple[List[bytes], array.array]:
+        """Return copies of the raw payloads and the timestamps of all entries"""
+        head = self._head
+        return self._payloads[head:], self._timestamps[head:]
+
+    def extend(self, payloads: List[bytes], timestamps: array.array) -> int:
+        """Append raw entries in bulk, returns the number of evicted entries"""
+        self._payloads.extend(payloads)
+        self._timestamps.extend(timestamps)
+        self._appended += len(payloads)
+
+        size = sum(map(len, payloads)) + len(payloads) * ENTRY_OVERHEAD
+        self._nbytes += size
+        if self._budget:
+            self._budget.entries += len(payloads)
+            self._budget.nbytes += size
+        return self._enforce_limits()
+
+    def append(self, payload: bytes, timestamp: float) -> int:
+        """Append an entry, returns the number of entries evicted to stay within the limits"""
+        self._payloads.append(payload)
+        self._timestamps.append(timestamp)
+        self._appended += 1
+
+        size = len(payload) + ENTRY_OVERHEAD
+        self._nbytes += size
+        if self._budget:
+            self._budget.entries += 1
+            self._budget.nbytes += size
+        return self._enforce_limits()
+
+    def evict(self, count: int) -> int:
+        """Evict up to count oldest entries, always keeping the latest one"""
+        count = min(count, len(self) - 1)
+        if count <= 0:
+            return 0
+
+        head = self._head
+        size = sum(len(raw) for raw in self._payloads[head : head + count]) + count * ENTRY_OVERHEAD
+        self._payloads[head : head + count] = [b""] * count  # Free the payloads right away
+        self._head = head + count
+        self._nbytes -= size
+
+        if self._budget:
+            self._budget.entries -= count
+            self._budget.nbytes -= size
+            self._budget.evicted += count
+
+        if self._head * 2 >= len(self._payloads):
+            self._compact()
+        return count
+
+    def load(self) -> int:
+        """Make sure the entries are in memory and within the per-topic limits, returns the
+        number of entries evicted to stay within them"""
+        return self._enforce_limits()
+
+    def _enforce_limits(self) -> int:
+        if not self._budget:
+            return 0
+
+        limits = self._budget.limits
+        evicted = 0
+        if limits.max_entries and len(self) > limits.max_entries:
+            evicted += self.evict(len(self) - limits.max_entries)
+        while limits.max_bytes and self._nbytes > limits.max_bytes and len(self) > 1:
+            evicted += self.evict(1)
+        return evicted
+
+    def _compact(self):
+        head = self._head
+        del self._payloads[:head]
+        del self._timestamps[:head]
+        self._head = 0
+
+    def _storage_index(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("history index out of range")
+        return self._head + index
+
+
+class MqLazyPayloadHistory(MqPayloadHistory):
+    """History restored from a session file, only read from it when its entries are accessed.
+
+    load returns the raw payloads and the timestamps of the entries. Until then the history
+    only knows its length and isn't accounted in the budget.
+    """
+
+    __slots__ = ("_load",)
+
+    def __init__(
+        self,
+        budget: Optional[MqHistoryBudget],
+        entries: int,
+        load: Callable[[], Tuple[List[bytes], array.array]],
+    ):
+        # The storage slots are left unset, accessing them loads the entries (see __getattr__)
+        self._budget = budget
+        self._head = 0
+        self._nbytes = 0
+        self._appended = entries
+        self._load = load
+
+    def __len__(self) -> int:
+        if self._load:
+            return self._appended
+        return len(self._payloads) - self._head
+
+    def __getattr__(self, name):
+        # Only called for unset attributes
+        if name not in ("_payloads", "_timestamps"):
+            raise AttributeError(name)
+
+        with _load_lock:
+            if self._load:  # Unless another thread loaded the entries meanwhile
+                self._payloads, self._timestamps = self._load()
+                size = sum(map(len, self._payloads)) + len(self._payloads) * ENTRY_OVERHEAD
+                self._nbytes = size
+                if self._budget:
+                    self._budget.entries += len(self._payloads)
+                    self._budget.nbytes += size
+                # Last, readers checking _load without the lock then find the entries set
+                self._load = None
+        return object.__getattribute__(self, name)
+
+    def load(self) -> int:
+        # The session may have been saved with higher limits than the current ones
+        self._payloads  # Reads the entries, see __getattr__
+        return super().load()
+
+    def raw_entries(self) -> Iterator[Tuple[bytes, float]]:
+        load = self._load
+        if load:  # Don't keep entries that are only read to be saved
+            return zip(*load())
+        return super().raw_entries()
+
+    def columns(self) -> Tuple[List[bytes], array.array]:
+        load = self._load
+        if load:
+            return load()
+        return super().columns()
@@ -57,6 +57,9 @@ Changes:
               ...    document = json.load(f)
               ...    model.load(document)
 
+    4. update() applies a changed document as the differences to the
+       current one, so views keep their expanded items and scroll position.
+
 """
 
 import json
@@ -140,6 +143,14 @@ class QJsonTreeItem(object):
         return rootItem
 
 
+def _children(value):
+    """The children of a container as (key, value) pairs, in the order
+    QJsonTreeItem.load() adds them"""
+    if isinstance(value, dict):
+        return sorted(value.items())
+    return list(enumerate(value))
+
+
 class QJsonModel(QtCore.QAbstractItemModel):
     def __init__(self, parent=None, read_only=False):
         super(QJsonModel, self).__init__(parent)
@@ -173,6 +184,133 @@ class QJsonModel(QtCore.QAbstractItemModel):
 
         return True
 
+    def update(self, document):
+        """Update to a new version of the document
+
+        Only the rows that changed are inserted, removed or updated, instead
+        of resetting the model like load().
+
+        Arguments:
+            document (dict): JSON-compatible dictionary
+
+        """
+
+        if self._rootItem.type is not type(document) or not isinstance(
+            document, (dict, list)
+        ):
+            return self.load(document)
+
+        self._updateChildren(self._rootItem, QtCore.QModelIndex(), document)
+
+        return True
+
+    def _updateChildren(self, item, index, value):
+        """Update the children of a container item to the children of value,
+        a container of the same type"""
+        new_children = _children(value)
+        children = item._children
+        if len(children) != len(new_children) or any(
+            child.key != key for child, (key, _value) in zip(children, new_children)
+        ):
+            self._updateKeys(item, index, value, new_children)
+
+        # Both have the same keys now, update the values and signal the changed
+        # rows at once
+        first_changed = last_changed = None
+        for row, (child, (_key, child_value)) in enumerate(zip(children, new_children)):
+            if child.type is not type(child_value):
+                if not self._replaceItem(
+                    child, self.createIndex(row, 0, child), child_value
+                ):
+                    continue
+            elif isinstance(child_value, (dict, list)):
+                self._updateChildren(child, self.createIndex(row, 0, child), child_value)
+                continue
+            elif child.value == child_value:
+                continue
+            else:
+                child.value = child_value
+
+            if first_changed is None:
+                first_changed = row
+            last_changed = row
+
+        if first_changed is not None:
+            self.dataChanged.emit(
+                self.createIndex(first_changed, 1, children[first_changed]),
+                self.createIndex(last_changed, 1, children[last_changed]),
+            )
+
+    def _updateKeys(self, item, index, value, new_children):
+        """Remove and insert the children of item for it to have the keys of
+        new_children, in the same order"""
+        if isinstance(value, list):
+            count = item.childCount()
+            if len(new_children) < count:
+                self._removeChildren(item, index, len(new_children), count)
+            elif len(new_children) > count:
+                self._insertChildren(item, index, count, new_children[count:])
+            return
+
+        # Remove the keys that are gone, from the last to keep the rows valid
+        keys = set(value)
+        end = item.childCount()
+        for row in range(item.childCount() - 1, -1, -1):
+            if item.child(row).key in keys:
+                if row + 1 < end:
+                    self._removeChildren(item, index, row + 1, end)
+                end = row
+        if end > 0:
+            self._removeChildren(item, index, 0, end)
+
+        # Insert the new keys in runs, at their sorted position
+        old_keys = set(child.key for child in item._children)
+        row = 0
+        while row < len(new_children):
+            if new_children[row][0] in old_keys:
+                row += 1
+                continue
+            end = row
+            while end < len(new_children) and new_children[end][0] not in old_keys:
+                end += 1
+            self._insertChildren(item, index, row, new_children[row:end])
+            row = end
+
+    def _replaceItem(self, item, index, value):
+        """Change an item to a value of another type, returns whether its own
+        value changed"""
+        if item.childCount():
+            self.beginRemoveRows(index, 0, item.childCount() - 1)
+            item._children = []
+            self.endRemoveRows()
+
+        old_value = item.value
+        item.type = type(value)
+        if isinstance(value, (dict, list)):
+            item.value = ""
+            if value:
+                self._insertChildren(item, index, 0, _children(value))
+        else:
+            item.value = value
+        return item.value != old_value or type(item.value) is not type(old_value)
+
+    def _insertChildren(self, item, index, row, children):
+        """Insert children given as (key, value) pairs, as rows starting at row"""
+        self.beginInsertRows(index, row, row + len(children) - 1)
+        items = []
+        for key, value in children:
+            child = QJsonTreeItem.load(value, item)
+            child.key = key
+            child.type = type(value)
+            items.append(child)
+        item._children[row:row] = items
+        self.endInsertRows()
+
+    def _removeChildren(self, item, index, row, end):
+        self.beginRemoveRows(index, row, end - 1)
+        del item._children[row:end]
+        self.endRemoveRows()
+
     def json(self, root=None):
         """Serialise model as JSON-compliant dictionary
 
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import Iterable, Iterator, Optional
+import heapq
+import threading
+import time
+
+from PySide6 import QtCore
+
+from models.capture import CaptureSession, MqCapturedMessage
+from models.mqtreemodel import MqTreeModel, MqTreeNode
+from models.mqttlistener import MqttListener
+
+
+# How often the replay reports its progress, in messages
+PROGRESS_INTERVAL = 10_000
+# How long to wait for the model to catch up when its ingestion queue is full, in seconds
+BACKLOG_WAIT = 0.001
+
+
+def history_messages(root: MqTreeNode) -> Iterator[MqCapturedMessage]:
+    """Merge the history of all topics below root into a single stream in timestamp order"""
+    histories = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        stack.extend(node._children)
+        if len(node.payload_history):
+            histories.append(_node_messages(node))
+    return heapq.merge(*histories, key=lambda message: message.timestamp)
+
+
+def _node_messages(node: MqTreeNode) -> Iterator[MqCapturedMessage]:
+    topic = node.full_topic()
+    for payload, timestamp in node.payload_history.raw_entries():
+        yield MqCapturedMessage(topic, payload, timestamp, 0, False)
+
+
+def session_messages(session) -> Iterator[MqCapturedMessage]:
+    """All messages of a session returned by load_session, in timestamp order"""
+    if isinstance(session, CaptureSession):  # Already recorded in order
+        return session.messages()
+    return history_messages(session.build_tree())
+
+
+class MqReplayer(QtCore.QThread):
+    """Replays recorded messages on a worker thread.
+
+    Messages are fed to the model through on_message, like messages from the broker, or
+    republished to a broker. speed scales the original timing: 1 replays in real time, 10
+    ten times faster and 0 as fast as possible. When feeding a model, the replay waits for it
+    to catch up instead of overflowing its ingestion queue, so replaying as fast as possible
+    measures the model's throughput.
+    """
+
+    progress = QtCore.Signal(int)  # Number of messages replayed so far
+    # Number of messages replayed and the elapsed time in seconds, emitted once the model has
+    # taken in all of them
+    replayed = QtCore.Signal(int, float)
+
+    def __init__(
+        self,
+        messages: Iterable[MqCapturedMessage],
+        *,
+        speed: float = 1.0,
+        model: Optional[MqTreeModel] = None,
+        publisher: Optional[MqttListener] = None,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self._messages = messages
+        self._speed = speed
+        self._model = model
+        self._publisher = publisher
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+        self.wait()
+
+    def run(self):
+        queue = self._model.ingest_queue if self._model else None
+        count = 0
+        first_timestamp = None
+        start = time.monotonic()
+
+        for message in self._messages:
+            if self._stop.is_set():
+                return
+
+            if self._speed:
+                if first_timestamp is None:
+                    first_timestamp = message.timestamp
+                due = start + (message.timestamp - first_timestamp) / self._speed
+                delay = due - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    return
+
+            if self._publisher:
+                self._publisher.publish(
+                    message.topic, message.payload, qos=message.qos, retain=message.retain
+                )
+            else:
+                while len(queue) >= queue.max_size:
+                    if self._stop.wait(BACKLOG_WAIT):
+                        return
+                self._model.on_message(None, None, message)
+
+            count += 1
+            if count % PROGRESS_INTERVAL == 0:
+                self.progress.emit(count)
+
+        while queue is not None and len(queue):
+            if self._stop.wait(BACKLOG_WAIT):
+                return
+        self.replayed.emit(count, time.monotonic() - start)
@@ -0,0 +1,391 @@
+"""Session files.
+
+Two formats are supported and told apart by their first bytes:
+
+* JSON: {"config": {...}, "state": <node>}, where each node is a dict of its topic
+  fragment, its [payload, timestamp] history and its children. Payloads that aren't valid
+  UTF-8 are stored base64 encoded, with their history indexes listed under an extra key.
+* Binary (little-endian), laid out as:
+
+  - Header: magic, format version, default codec, root node offset and string table offset
+  - Connection config as length-prefixed JSON
+  - Node records, written children first:
+      fragment string id, child count, subtree counters, history entry count,
+      latest payload (length-prefixed), history block, child record offsets
+  - String table of all topic fragments: count, lengths, then the UTF-8 data
+
+  Binary sessions are read lazily: a node is only read when its parent's children are
+  accessed, and its history when the history is.
+
+  A history block is a codec byte, the raw and stored lengths, then the (compressed)
+  timestamps in microseconds delta-encoded from the previous entry, the payload lengths and
+  the raw payloads.
+"""
+
+from __future__ import annotations
+from typing import BinaryIO, Callable, List, Optional, TextIO, Tuple
+import array
+import functools
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+from PySide6 import QtCore
+
+from common import consts
+from models.capture import CAPTURE_MAGIC, CaptureSession
+from models.mqtreemodel import MqLazyTreeNode, MqTreeModel, MqTreeNode
+from models.payloadhistory import MqHistoryBudget, MqLazyPayloadHistory, history_to_json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# How many nodes are written between two progress reports
+PROGRESS_INTERVAL = 1000
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+BINARY_MAGIC = b"MQNAVSES"
+BINARY_VERSION = 1
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+DEFAULT_CODEC = CODEC_ZSTD if zstandard else CODEC_ZLIB
+# History blocks smaller than this are stored uncompressed
+MIN_COMPRESSED_SIZE = 256
+
+# Magic, version, codec, reserved, root node offset, string table offset
+_HEADER = struct.Struct("<8sHHIQQ")
+# Fragment id, children, descendants, leaves, direct leaves, messages, history entries
+_NODE = struct.Struct("<IIQQIQI")
+# Codec, raw length, stored length
+_BLOCK = struct.Struct("<BII")
+_U32 = struct.Struct("<I")
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class SessionFormatError(ValueError):
+    pass
+
+
+def write_session_json(
+    session_file: TextIO,
+    config: dict,
+    root: MqTreeNode,
+    progress: Optional[Callable[[int], None]] = None,
+):
+    """Write a session in the JSON format, walking the tree instead of building a dict of it"""
+    session_file.write(f'{{"config":{_encode(config)},"state":')
+
+    written = 0
+    # Each stack entry is a node to open, or None to close the innermost open node
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            session_file.write("]}")
+            if stack and stack[-1] is not None:
+                session_file.write(",")  # More siblings to come
+            continue
+
+        history, binary = history_to_json(node.payload_history.raw_entries())
+        if binary:
+            session_file.write(f'{{"{consts.SESSION_BINARY_KEY}":{_encode(binary)},')
+        else:
+            session_file.write("{")
+        session_file.write(
+            f'"{consts.SESSION_TOPIC_FRAGMENT_KEY}":{_encode(node.topic_fragment)},'
+            f'"{consts.SESSION_HISTORY_KEY}":{_encode(history)},"{consts.SESSION_CHILDREN_KEY}":['
+        )
+
+        stack.append(None)
+        stack.extend(reversed(node._children))
+
+        written += 1
+        if progress and written % PROGRESS_INTERVAL == 0:
+            progress(written)
+
+    session_file.write("}")
+
+
+def write_session_binary(
+    session_file: BinaryIO,
+    config: dict,
+    root: MqTreeNode,
+    progress: Optional[Callable[[int], None]] = None,
+    codec: int = DEFAULT_CODEC,
+):
+    """Write a session in the binary format"""
+    # The header is written last, once the offsets are known
+    session_file.write(bytes(_HEADER.size))
+    config_data = json.dumps(config).encode("UTF-8")
+    session_file.write(_U32.pack(len(config_data)) + config_data)
+    position = _HEADER.size + _U32.size + len(config_data)
+
+    strings = {}  # Topic fragment -> string table index
+    written = 0
+    # Children are written before their parents, so the parent records can point to them
+    stack: List[Tuple[MqTreeNode, List[int]]] = [(root, [])]
+    while stack:
+        node, child_offsets = stack[-1]
+        if len(child_offsets) < len(node._children):
+            stack.append((node._children[len(child_offsets)], []))
+            continue
+
+        stack.pop()
+        if stack:
+            stack[-1][1].append(position)
+        else:
+            root_offset = position
+
+        record = _encode_node(node, child_offsets, strings, codec)
+        session_file.write(record)
+        position += len(record)
+
+        written += 1
+        if progress and written % PROGRESS_INTERVAL == 0:
+            progress(written)
+
+    encoded = [fragment.encode("UTF-8") for fragment in strings]
+    session_file.write(
+        _U32.pack(len(encoded))
+        + np.fromiter(map(len, encoded), dtype="<u4", count=len(encoded)).tobytes()
+        + b"".join(encoded)
+    )
+
+    session_file.seek(0)
+    session_file.write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, codec, 0, root_offset, position))
+
+
+def _encode_node(node: MqTreeNode, child_offsets: List[int], strings: dict, codec: int) -> bytes:
+    fragment_id = strings.setdefault(node.topic_fragment, len(strings))
+    payloads, timestamps = node.payload_history.columns()
+    latest = payloads[-1] if payloads else b""
+
+    return b"".join(
+        (
+            _NODE.pack(
+                fragment_id,
+                len(node._children),
+                node.recursive_child_count(),
+                node.recursive_child_count(leaves=True),
+                node.child_count(leaves=True),
+                node.recursive_message_count(),
+                len(payloads),
+            ),
+            _U32.pack(len(latest)),
+            latest,
+            _encode_history_block(payloads, timestamps, codec),
+            np.asarray(child_offsets, dtype="<u8").tobytes(),
+        )
+    )
+
+
+def _encode_history_block(payloads: List[bytes], timestamps: array.array, codec: int) -> bytes:
+    micros = np.rint(np.frombuffer(timestamps, dtype=np.float64) * 1_000_000).astype("<i8")
+    deltas = np.diff(micros, prepend=np.int64(0)).astype("<i8", copy=False)
+    lengths = np.fromiter(map(len, payloads), dtype="<u4", count=len(payloads))
+    raw = b"".join((deltas.tobytes(), lengths.tobytes(), *payloads))
+
+    if len(raw) < MIN_COMPRESSED_SIZE:
+        codec = CODEC_NONE
+    if codec == CODEC_ZSTD:
+        stored = zstandard.ZstdCompressor().compress(raw)
+    elif codec == CODEC_ZLIB:
+        stored = zlib.compress(raw, 1)
+    else:
+        stored = raw
+    return _BLOCK.pack(codec, len(raw), len(stored)) + stored
+
+
+def _decompress(codec: int, stored: bytes, raw_length: int) -> bytes:
+    if codec == CODEC_NONE:
+        return stored
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(stored)
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise SessionFormatError("Session is zstd compressed, but zstandard isn't installed")
+        return zstandard.ZstdDecompressor().decompress(stored, max_output_size=raw_length)
+    raise SessionFormatError(f"Unknown history block codec {codec}")
+
+
+class JsonSession:
+    lazy = False
+
+    def __init__(self, session_file: TextIO):
+        session = json.load(session_file)
+        self.config = session["config"]
+        self._state = session["state"]
+
+    def history_entry_count(self) -> int:
+        entries = 0
+        stack = [self._state]
+        while stack:
+            state = stack.pop()
+            entries += len(state[consts.SESSION_HISTORY_KEY])
+            stack.extend(state[consts.SESSION_CHILDREN_KEY])
+        return entries
+
+    def build_tree(self, budget: Optional[MqHistoryBudget] = None) -> MqTreeNode:
+        return MqTreeNode.parse(self._state, budget)
+
+
+class BinarySession:
+    lazy = True
+
+    def __init__(self, session_file: BinaryIO):
+        self._data = mmap.mmap(session_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _codec, _reserved, self._root_offset, strings_offset = (
+            _HEADER.unpack_from(self._data)
+        )
+        if magic != BINARY_MAGIC:
+            raise SessionFormatError("Not a binary session file")
+        if version > BINARY_VERSION:
+            raise SessionFormatError(f"Unsupported session format version {version}")
+
+        (config_length,) = _U32.unpack_from(self._data, _HEADER.size)
+        config_start = _HEADER.size + _U32.size
+        self.config = json.loads(self._data[config_start : config_start + config_length])
+
+        (count,) = _U32.unpack_from(self._data, strings_offset)
+        lengths_start = strings_offset + _U32.size
+        strings_start = lengths_start + 4 * count
+        lengths = np.frombuffer(self._data, dtype="<u4", count=count, offset=lengths_start)
+        offsets = [strings_start] + (np.cumsum(lengths) + strings_start).tolist()
+        self._strings = [
+            self._data[start:end].decode("UTF-8") for start, end in zip(offsets, offsets[1:])
+        ]
+
+    def history_entry_count(self) -> int:
+        return _NODE.unpack_from(self._data, self._root_offset)[5]
+
+    def build_tree(self, budget: Optional[MqHistoryBudget] = None) -> MqTreeNode:
+        """Return the root of the session tree.
+
+        Nodes are only read when their parent's children are accessed, and their history when
+        it is, so opening a session doesn't depend on its size.
+        """
+        return self._read_node(self._root_offset, budget)
+
+    def _read_node(self, offset: int, budget: Optional[MqHistoryBudget]) -> MqLazyTreeNode:
+        data = self._data
+        (
+            fragment_id,
+            child_count,
+            descendant_count,
+            leaf_count,
+            direct_leaf_count,
+            message_count,
+            entries,
+        ) = _NODE.unpack_from(data, offset)
+        offset += _NODE.size
+
+        (latest_length,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        payload = data[offset : offset + latest_length]
+        offset += latest_length
+
+        history = MqLazyPayloadHistory(
+            budget, entries, functools.partial(self._read_history, offset, entries)
+        )
+        _codec, _raw_length, stored_length = _BLOCK.unpack_from(data, offset)
+        offset += _BLOCK.size + stored_length
+
+        return MqLazyTreeNode(
+            self._strings[fragment_id],
+            payload,
+            history,
+            child_count=child_count,
+            descendant_count=descendant_count,
+            leaf_count=leaf_count,
+            direct_leaf_count=direct_leaf_count,
+            message_count=message_count,
+            load_children=functools.partial(self._read_children, offset, child_count, budget),
+        )
+
+    def _read_children(
+        self, offset: int, count: int, budget: Optional[MqHistoryBudget]
+    ) -> List[MqLazyTreeNode]:
+        child_offsets = np.frombuffer(self._data, dtype="<u8", count=count, offset=offset)
+        return [self._read_node(child_offset, budget) for child_offset in child_offsets.tolist()]
+
+    def _read_history(self, offset: int, entries: int) -> Tuple[List[bytes], array.array]:
+        if not entries:
+            return [], array.array("d")
+
+        codec, raw_length, stored_length = _BLOCK.unpack_from(self._data, offset)
+        offset += _BLOCK.size
+        block = _decompress(codec, self._data[offset : offset + stored_length], raw_length)
+        micros = np.cumsum(np.frombuffer(block, dtype="<i8", count=entries))
+        lengths = np.frombuffer(block, dtype="<u4", count=entries, offset=8 * entries)
+        ends = (np.cumsum(lengths) + 12 * entries).tolist()
+        return (
+            [block[start:end] for start, end in zip([12 * entries] + ends, ends)],
+            array.array("d", (micros / 1_000_000).tobytes()),
+        )
+
+
+def load_session(path: str):
+    """Open a session file, detecting its format.
+
+    Returns a JsonSession, a BinarySession or a CaptureSession for capture files.
+    """
+    with open(path, "rb") as session_file:
+        magic = session_file.read(len(BINARY_MAGIC))
+        if magic == BINARY_MAGIC:
+            return BinarySession(session_file)
+        if magic == CAPTURE_MAGIC:
+            return CaptureSession(session_file)
+
+    with open(path) as session_file:
+        return JsonSession(session_file)
+
+
+class SessionSaveWorker(QtCore.QThread):
+    """Writes a model's session to disk on a worker thread.
+
+    The model must not change while the worker runs, so ingestion should be paused first.
+    """
+
+    progress = QtCore.Signal(int)  # Number of nodes written so far
+
+    def __init__(self, path: str, model: MqTreeModel, parent=None, *, binary: bool = True):
+        super().__init__(parent)
+        self._path = path
+        self._binary = binary
+        self._config = model.session_config()
+        self._root = model.root()
+        self.succeeded = False
+
+    @property
+    def total(self) -> int:
+        return self._root.recursive_child_count() + 1
+
+    def run(self):
+        # Write to a temporary file first so a failed save doesn't destroy an existing session
+        temp_path = self._path + ".tmp"
+        try:
+            if self._binary:
+                with open(temp_path, "wb", buffering=WRITE_BUFFER_SIZE) as session_file:
+                    write_session_binary(session_file, self._config, self._root, self.progress.emit)
+            else:
+                with open(temp_path, "w", buffering=WRITE_BUFFER_SIZE) as session_file:
+                    write_session_json(session_file, self._config, self._root, self.progress.emit)
+            os.replace(temp_path, self._path)
+        except Exception:  # Also compressor and struct errors, the thread must not leak them
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        self.succeeded = True
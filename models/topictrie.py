@@ -0,0 +1,75 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+from models.mqttlistener import validate_topic_filter
+
+
+class _TrieNode:
+    __slots__ = ("children", "entry")
+
+    def __init__(self):
+        self.children: Dict[str, _TrieNode] = {}
+        self.entry: Optional[int] = None  # Index of the first pattern ending here
+
+
+class MqTopicTrie:
+    """MQTT topic filters compiled into a trie of topic levels.
+
+    Matching a topic walks its levels once, following the literal level and the + and #
+    wildcards at each step, so the cost doesn't grow with the number of patterns. When several
+    patterns match, the one added first wins.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._values: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, pattern: str, value: Any):
+        """Raises ValueError if pattern isn't a valid topic filter"""
+        validate_topic_filter(pattern)
+        node = self._root
+        for level in pattern.split("/"):
+            node = node.children.setdefault(level, _TrieNode())
+        if node.entry is None:
+            node.entry = len(self._values)
+        self._values.append(value)
+
+    def match(self, topic: str) -> Optional[Any]:
+        """The value of the first added pattern matching topic, or None"""
+        first = len(self._values)
+        levels = topic.split("/")
+        # Wildcards don't match topics starting with $ at the first level, e.g. $SYS
+        wildcards = not topic.startswith("$")
+
+        nodes = [self._root]
+        for level in levels:
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if wildcards:
+                    rest = children.get("#")
+                    if rest and rest.entry < first:
+                        first = rest.entry
+                    any_level = children.get("+")
+                    if any_level:
+                        next_nodes.append(any_level)
+                child = children.get(level)
+                if child:
+                    next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                break
+            wildcards = True
+
+        for node in nodes:
+            if node.entry is not None and node.entry < first:
+                first = node.entry
+            # a/# also matches a itself
+            rest = node.children.get("#")
+            if rest and rest.entry < first:
+                first = rest.entry
+
+        return self._values[first] if first < len(self._values) else None
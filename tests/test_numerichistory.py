@@ -0,0 +1,55 @@
+"""Numeric histories following their payload history"""
+
+import numpy as np
+
+from models.numerichistory import MqNumericHistory
+from models.payloadhistory import MqHistoryBudget, MqHistoryLimits, MqPayloadHistory
+
+
+def _history(payloads, max_entries=0) -> MqPayloadHistory:
+    history = MqPayloadHistory(MqHistoryBudget(MqHistoryLimits(max_entries, 0, 0, 0)))
+    for index, payload in enumerate(payloads):
+        history.append(payload, 1700000000.0 + index)
+    return history
+
+
+def test_points_of_numeric_entries():
+    history = _history([b"1.5", b"on", b"-2", b"inf", b"nan", b"3e2"])
+    numeric = MqNumericHistory(history)
+    assert numeric.update() == (0, 3)
+
+    assert list(numeric.points.y) == [1.5, -2.0, 300.0]
+    assert list(numeric.points.indexes) == [0, 2, 5]
+    assert list(numeric.points.x) == [1700000000000.0, 1700000002000.0, 1700000005000.0]
+    assert list(numeric.valid) == [True, False, True, False, False, True]
+
+
+def test_valid_when_evicted_between_updates():
+    history = _history([b"0", b"x", b"2", b"3"], max_entries=4)
+    numeric = MqNumericHistory(history)
+    numeric.update()
+
+    history.append(b"4", 1700000004.0)
+    history.append(b"5", 1700000005.0)
+    assert history.first_index == 2
+    # Still as of the last update
+    assert list(numeric.valid) == [True, False, True, True]
+    assert np.count_nonzero(numeric.valid) == len(numeric.points)
+
+    assert numeric.update() == (1, 2)  # Entry 1 had no point
+    assert list(numeric.points.indexes) == [2, 3, 4, 5]
+    assert list(numeric.valid) == [True, True, True, True]
+
+
+def test_budget_accounts_points_until_released():
+    budget = MqHistoryBudget(MqHistoryLimits(0, 0, 0, 0))
+    history = MqPayloadHistory(budget)
+    history.append(b"1", 1700000000.0)
+    history_bytes = budget.nbytes
+
+    numeric = MqNumericHistory(history, budget=budget)
+    numeric.update()
+    assert budget.nbytes == history_bytes + numeric.points.nbytes
+
+    numeric.release()
+    assert budget.nbytes == history_bytes
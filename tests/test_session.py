@@ -0,0 +1,172 @@
+"""Round trips of the session formats"""
+
+import json
+import os
+import struct
+
+import pytest
+
+from models import session
+from models.mqtreemodel import MqTreeNode
+from models.payloadhistory import MqHistoryBudget, MqHistoryLimits, MqPayloadHistory
+
+CONFIG = {"host": "broker", "port": 1883, "username": None, "password": None}
+
+# Topic -> history of (payload, timestamp), the last entry being the latest payload
+TOPICS = {
+    "sensors/temp": [(b"21.5", 1700000000.25), (b"21.75", 1700000001.5)],
+    "sensors/raw": [(b"\xff\x00\xfe binary", 1700000002.0), (b"\x80", 1700000002.125)],
+    "sensors/big": [(b"x" * 300 + bytes([i]), 1700000003.0 + i) for i in range(20)],
+    "status": [("café ✓".encode("UTF-8"), 1700000004.0)],
+    "cleared/retained": [(b"on", 1700000005.0), (b"", 1700000006.0)],  # Not a leaf anymore
+}
+
+
+def _build_tree() -> MqTreeNode:
+    budget = MqHistoryBudget(MqHistoryLimits(0, 0, 0, 0))
+    root = MqTreeNode("", b"", MqPayloadHistory(budget))
+    for topic, history in TOPICS.items():
+        node = root
+        for fragment in topic.split("/"):
+            child = node.find_child(fragment)
+            if child is None:
+                child = MqTreeNode(fragment, b"", MqPayloadHistory(budget))
+                node.append_child(child)
+            node = child
+        for payload, timestamp in history:
+            node.update_payload(payload, timestamp)
+    return root
+
+
+def _snapshot(node: MqTreeNode) -> dict:
+    return {
+        "fragment": node.topic_fragment,
+        "payload": bytes(node.payload),
+        "history": [
+            (bytes(payload), timestamp) for payload, timestamp in node.payload_history.raw_entries()
+        ],
+        "counts": (
+            node.recursive_child_count(),
+            node.recursive_child_count(leaves=True),
+            node.recursive_message_count(),
+        ),
+        "children": [_snapshot(child) for child in node._children],
+    }
+
+
+def _save(path, root, *, binary: bool, codec: int = session.DEFAULT_CODEC):
+    if binary:
+        with open(path, "wb") as session_file:
+            session.write_session_binary(session_file, CONFIG, root, codec=codec)
+    else:
+        with open(path, "w") as session_file:
+            session.write_session_json(session_file, CONFIG, root)
+
+
+def _codecs():
+    codecs = [session.CODEC_NONE, session.CODEC_ZLIB]
+    zstd = pytest.mark.skipif(session.zstandard is None, reason="zstandard isn't installed")
+    return codecs + [pytest.param(session.CODEC_ZSTD, marks=zstd)]
+
+
+@pytest.mark.parametrize("codec", _codecs())
+def test_binary_round_trip(tmp_path, codec):
+    root = _build_tree()
+    path = tmp_path / "session.mqtt-navigator"
+    _save(path, root, binary=True, codec=codec)
+
+    loaded = session.load_session(str(path))
+    assert isinstance(loaded, session.BinarySession)
+    assert loaded.config == CONFIG
+    assert loaded.history_entry_count() == sum(map(len, TOPICS.values()))
+    assert _snapshot(loaded.build_tree()) == _snapshot(root)
+
+
+def test_json_round_trip(tmp_path):
+    root = _build_tree()
+    path = tmp_path / "session.json"
+    _save(path, root, binary=False)
+
+    loaded = session.load_session(str(path))
+    assert isinstance(loaded, session.JsonSession)
+    assert loaded.config == CONFIG
+    assert _snapshot(loaded.build_tree()) == _snapshot(root)
+
+
+def test_json_to_binary_and_back(tmp_path):
+    root = _build_tree()
+    json_path = tmp_path / "session.json"
+    binary_path = tmp_path / "session.mqtt-navigator"
+    json_again_path = tmp_path / "session-again.json"
+
+    _save(json_path, root, binary=False)
+    _save(binary_path, session.load_session(str(json_path)).build_tree(), binary=True)
+    _save(json_again_path, session.load_session(str(binary_path)).build_tree(), binary=False)
+
+    assert _snapshot(session.load_session(str(json_again_path)).build_tree()) == _snapshot(root)
+    with open(json_path) as first, open(json_again_path) as second:
+        assert json.load(first) == json.load(second)
+
+
+def test_binary_is_read_lazily(tmp_path):
+    path = tmp_path / "session.mqtt-navigator"
+    _save(path, _build_tree(), binary=True)
+
+    budget = MqHistoryBudget(MqHistoryLimits(0, 0, 0, 0))
+    root = session.load_session(str(path)).build_tree(budget)
+    # The counters are known without reading the children or the histories
+    assert root.child_count() == 3
+    assert root.recursive_child_count(leaves=True) == len(TOPICS) - 1
+    assert root.loaded_children() == []
+
+    sensors = root.find_child("sensors")
+    raw = sensors.find_child("raw")
+    assert len(raw.payload_history) == 2
+    assert budget.entries == 0  # Histories enter the budget when they are read
+
+    assert raw.payload_history[0].payload == repr(b"\xff\x00\xfe binary")
+    assert budget.entries == 2
+    assert budget.nbytes == raw.payload_history.nbytes
+
+
+def test_save_worker_removes_temp_file_on_error(tmp_path, monkeypatch):
+    class Model:
+        def session_config(self):
+            return CONFIG
+
+        def root(self):
+            return _build_tree()
+
+    def overflow(*_args):
+        raise struct.error("argument out of range")
+
+    path = tmp_path / "session.mqtt-navigator"
+    path.write_bytes(b"previous session")
+    monkeypatch.setattr(session, "write_session_binary", overflow)
+
+    worker = session.SessionSaveWorker(str(path), Model())
+    worker.run()  # On this thread
+
+    assert not worker.succeeded
+    assert not os.path.exists(str(path) + ".tmp")
+    assert path.read_bytes() == b"previous session"
+
+
+def test_lazy_history_is_loaded_within_the_current_limits(tmp_path):
+    path = tmp_path / "session.mqtt-navigator"
+    _save(path, _build_tree(), binary=True)  # Saved without limits
+
+    budget = MqHistoryBudget(MqHistoryLimits(max_entries=5, max_bytes=0, total_max_bytes=0))
+    root = session.load_session(str(path)).build_tree(budget)
+    sensors = root.find_child("sensors")
+    big = sensors.find_child("big")
+    messages = root.recursive_message_count()
+
+    assert big.load_history() == 15
+    assert len(big.payload_history) == 5
+    assert big.payload_history.first_index == 15
+    assert budget.entries == 5
+    assert budget.nbytes == big.payload_history.nbytes
+    # The counters of the node and its ancestors follow
+    assert big.recursive_message_count() == 5
+    assert root.recursive_message_count() == messages - 15
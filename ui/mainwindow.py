@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+## Form generated from reading UI file 'mainwindow.ui'
+##
+## Created by: Qt User Interface Compiler version 6.10.1
+##
+## WARNING! All changes made in this file will be lost when recompiling UI file!
+################################################################################
+
+from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
+    QMetaObject, QObject, QPoint, QRect,
+    QSize, QTime, QUrl, Qt)
+from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
+    QFont, QFontDatabase, QGradient, QIcon,
+    QImage, QKeySequence, QLinearGradient, QPainter,
+    QPalette, QPixmap, QRadialGradient, QTransform)
+from PySide6.QtWidgets import (QApplication, QCheckBox, QFormLayout, QHBoxLayout,
+    QHeaderView, QLabel, QLineEdit, QMainWindow,
+    QPushButton, QSizePolicy, QSpinBox, QSplitter,
+    QTabWidget, QTableView, QTextBrowser, QTextEdit,
+    QTreeView, QVBoxLayout, QWidget)
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        if not MainWindow.objectName():
+            MainWindow.setObjectName(u"MainWindow")
+        MainWindow.resize(830, 585)
+        self.central_widget = QWidget(MainWindow)
+        self.central_widget.setObjectName(u"central_widget")
+        self.horizontalLayout_2 = QHBoxLayout(self.central_widget)
+        self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
+        self.splitter_2 = QSplitter(self.central_widget)
+        self.splitter_2.setObjectName(u"splitter_2")
+        self.splitter_2.setOrientation(Qt.Horizontal)
+        self.layoutWidget = QWidget(self.splitter_2)
+        self.layoutWidget.setObjectName(u"layoutWidget")
+        self.verticalLayout_5 = QVBoxLayout(self.layoutWidget)
+        self.verticalLayout_5.setObjectName(u"verticalLayout_5")
+        self.verticalLayout_5.setContentsMargins(0, 0, 0, 0)
+        self.text_tree_search = QLineEdit(self.layoutWidget)
+        self.text_tree_search.setObjectName(u"text_tree_search")
+
+        self.verticalLayout_5.addWidget(self.text_tree_search)
+
+        self.tree_view = QTreeView(self.layoutWidget)
+        self.tree_view.setObjectName(u"tree_view")
+        sizePolicy = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(1)
+        sizePolicy.setHeightForWidth(self.tree_view.sizePolicy().hasHeightForWidth())
+        self.tree_view.setSizePolicy(sizePolicy)
+        self.tree_view.header().setDefaultSectionSize(120)
+
+        self.verticalLayout_5.addWidget(self.tree_view)
+
+        self.splitter_2.addWidget(self.layoutWidget)
+        self.layoutWidget_2 = QWidget(self.splitter_2)
+        self.layoutWidget_2.setObjectName(u"layoutWidget_2")
+        self.verticalLayout = QVBoxLayout(self.layoutWidget_2)
+        self.verticalLayout.setObjectName(u"verticalLayout")
+        self.verticalLayout.setContentsMargins(0, 0, 0, 0)
+        self.horizontalLayout = QHBoxLayout()
+        self.horizontalLayout.setObjectName(u"horizontalLayout")
+        self.formLayout_2 = QFormLayout()
+        self.formLayout_2.setObjectName(u"formLayout_2")
+        self.label_topic_rx = QLabel(self.layoutWidget_2)
+        self.label_topic_rx.setObjectName(u"label_topic_rx")
+
+        self.formLayout_2.setWidget(0, QFormLayout.ItemRole.LabelRole, self.label_topic_rx)
+
+        self.text_topic_rx = QTextBrowser(self.layoutWidget_2)
+        self.text_topic_rx.setObjectName(u"text_topic_rx")
+        sizePolicy1 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        sizePolicy1.setHorizontalStretch(0)
+        sizePolicy1.setVerticalStretch(0)
+        sizePolicy1.setHeightForWidth(self.text_topic_rx.sizePolicy().hasHeightForWidth())
+        self.text_topic_rx.setSizePolicy(sizePolicy1)
+        self.text_topic_rx.setMinimumSize(QSize(0, 32))
+        self.text_topic_rx.setMaximumSize(QSize(16777215, 32))
+        self.text_topic_rx.setBaseSize(QSize(0, 32))
+
+        self.formLayout_2.setWidget(0, QFormLayout.ItemRole.FieldRole, self.text_topic_rx)
+
+
+        self.horizontalLayout.addLayout(self.formLayout_2)
+
+        self.button_send_to_editor = QPushButton(self.layoutWidget_2)
+        self.button_send_to_editor.setObjectName(u"button_send_to_editor")
+
+        self.horizontalLayout.addWidget(self.button_send_to_editor)
+
+
+        self.verticalLayout.addLayout(self.horizontalLayout)
+
+        self.splitter = QSplitter(self.layoutWidget_2)
+        self.splitter.setObjectName(u"splitter")
+        self.splitter.setOrientation(Qt.Vertical)
+        self.rx_layout = QTabWidget(self.splitter)
+        self.rx_layout.setObjectName(u"rx_layout")
+        self.page_text = QWidget()
+        self.page_text.setObjectName(u"page_text")
+        self.verticalLayout_2 = QVBoxLayout(self.page_text)
+        self.verticalLayout_2.setObjectName(u"verticalLayout_2")
+        self.text_payload_rx = QTextBrowser(self.page_text)
+        self.text_payload_rx.setObjectName(u"text_payload_rx")
+
+        self.verticalLayout_2.addWidget(self.text_payload_rx)
+
+        self.rx_layout.addTab(self.page_text, "")
+        self.page_json = QWidget()
+        self.page_json.setObjectName(u"page_json")
+        self.verticalLayout_3 = QVBoxLayout(self.page_json)
+        self.verticalLayout_3.setObjectName(u"verticalLayout_3")
+        self.tree_json_rx = QTreeView(self.page_json)
+        self.tree_json_rx.setObjectName(u"tree_json_rx")
+        self.tree_json_rx.setEnabled(True)
+
+        self.verticalLayout_3.addWidget(self.tree_json_rx)
+
+        self.rx_layout.addTab(self.page_json, "")
+        self.page_history = QWidget()
+        self.page_history.setObjectName(u"page_history")
+        self.verticalLayout_4 = QVBoxLayout(self.page_history)
+        self.verticalLayout_4.setObjectName(u"verticalLayout_4")
+        self.table_history = QTableView(self.page_history)
+        self.table_history.setObjectName(u"table_history")
+        self.table_history.horizontalHeader().setCascadingSectionResizes(False)
+        self.table_history.horizontalHeader().setDefaultSectionSize(180)
+        self.table_history.horizontalHeader().setStretchLastSection(True)
+
+        self.verticalLayout_4.addWidget(self.table_history)
+
+        self.rx_layout.addTab(self.page_history, "")
+        self.page_chart = QWidget()
+        self.page_chart.setObjectName(u"page_chart")
+        self.page_chart.setStyleSheet(u"")
+        self.chart_layout = QVBoxLayout(self.page_chart)
+        self.chart_layout.setObjectName(u"chart_layout")
+        self.chart_layout.setContentsMargins(0, 0, 0, 0)
+        self.rx_layout.addTab(self.page_chart, "")
+        self.splitter.addWidget(self.rx_layout)
+        self.tx_widget = QWidget(self.splitter)
+        self.tx_widget.setObjectName(u"tx_widget")
+        self.formLayout = QFormLayout(self.tx_widget)
+        self.formLayout.setObjectName(u"formLayout")
+        self.formLayout.setFieldGrowthPolicy(QFormLayout.AllNonFixedFieldsGrow)
+        self.formLayout.setRowWrapPolicy(QFormLayout.DontWrapRows)
+        self.formLayout.setLabelAlignment(Qt.AlignRight|Qt.AlignTrailing|Qt.AlignVCenter)
+        self.formLayout.setFormAlignment(Qt.AlignLeading|Qt.AlignLeft|Qt.AlignVCenter)
+        self.label_payload = QLabel(self.tx_widget)
+        self.label_payload.setObjectName(u"label_payload")
+        sizePolicy2 = QSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
+        sizePolicy2.setHorizontalStretch(0)
+        sizePolicy2.setVerticalStretch(0)
+        sizePolicy2.setHeightForWidth(self.label_payload.sizePolicy().hasHeightForWidth())
+        self.label_payload.setSizePolicy(sizePolicy2)
+
+        self.formLayout.setWidget(2, QFormLayout.ItemRole.LabelRole, self.label_payload)
+
+        self.text_payload = QTextEdit(self.tx_widget)
+        self.text_payload.setObjectName(u"text_payload")
+
+        self.formLayout.setWidget(2, QFormLayout.ItemRole.FieldRole, self.text_payload)
+
+        self.label_qos = QLabel(self.tx_widget)
+        self.label_qos.setObjectName(u"label_qos")
+
+        self.formLayout.setWidget(3, QFormLayout.ItemRole.LabelRole, self.label_qos)
+
+        self.num_qos = QSpinBox(self.tx_widget)
+        self.num_qos.setObjectName(u"num_qos")
+        self.num_qos.setFrame(True)
+        self.num_qos.setMaximum(2)
+
+        self.formLayout.setWidget(3, QFormLayout.ItemRole.FieldRole, self.num_qos)
+
+        self.button_publish = QPushButton(self.tx_widget)
+        self.button_publish.setObjectName(u"button_publish")
+
+        self.formLayout.setWidget(7, QFormLayout.ItemRole.SpanningRole, self.button_publish)
+
+        self.label_topic = QLabel(self.tx_widget)
+        self.label_topic.setObjectName(u"label_topic")
+
+        self.formLayout.setWidget(1, QFormLayout.ItemRole.LabelRole, self.label_topic)
+
+        self.label_retain = QLabel(self.tx_widget)
+        self.label_retain.setObjectName(u"label_retain")
+
+        self.formLayout.setWidget(5, QFormLayout.ItemRole.LabelRole, self.label_retain)
+
+        self.checkbox_retain = QCheckBox(self.tx_widget)
+        self.checkbox_retain.setObjectName(u"checkbox_retain")
+        sizePolicy3 = QSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Fixed)
+        sizePolicy3.setHorizontalStretch(0)
+        sizePolicy3.setVerticalStretch(0)
+        sizePolicy3.setHeightForWidth(self.checkbox_retain.sizePolicy().hasHeightForWidth())
+        self.checkbox_retain.setSizePolicy(sizePolicy3)
+
+        self.formLayout.setWidget(5, QFormLayout.ItemRole.FieldRole, self.checkbox_retain)
+
+        self.text_topic = QLineEdit(self.tx_widget)
+        self.text_topic.setObjectName(u"text_topic")
+
+        self.formLayout.setWidget(1, QFormLayout.ItemRole.FieldRole, self.text_topic)
+
+        self.splitter.addWidget(self.tx_widget)
+
+        self.verticalLayout.addWidget(self.splitter)
+
+        self.splitter_2.addWidget(self.layoutWidget_2)
+
+        self.horizontalLayout_2.addWidget(self.splitter_2)
+
+        MainWindow.setCentralWidget(self.central_widget)
+#if QT_CONFIG(shortcut)
+        self.label_payload.setBuddy(self.text_payload)
+        self.label_qos.setBuddy(self.num_qos)
+#endif // QT_CONFIG(shortcut)
+        QWidget.setTabOrder(self.text_tree_search, self.tree_view)
+        QWidget.setTabOrder(self.tree_view, self.text_topic_rx)
+        QWidget.setTabOrder(self.text_topic_rx, self.button_send_to_editor)
+        QWidget.setTabOrder(self.button_send_to_editor, self.rx_layout)
+        QWidget.setTabOrder(self.rx_layout, self.text_payload_rx)
+        QWidget.setTabOrder(self.text_payload_rx, self.tree_json_rx)
+        QWidget.setTabOrder(self.tree_json_rx, self.table_history)
+        QWidget.setTabOrder(self.table_history, self.text_topic)
+        QWidget.setTabOrder(self.text_topic, self.text_payload)
+        QWidget.setTabOrder(self.text_payload, self.num_qos)
+        QWidget.setTabOrder(self.num_qos, self.checkbox_retain)
+        QWidget.setTabOrder(self.checkbox_retain, self.button_publish)
+
+        self.retranslateUi(MainWindow)
+
+        self.rx_layout.setCurrentIndex(0)
+
+
+        QMetaObject.connectSlotsByName(MainWindow)
+    # setupUi
+
+    def retranslateUi(self, MainWindow):
+        MainWindow.setWindowTitle(QCoreApplication.translate("MainWindow", u"MQTT Navigator", None))
+        self.text_tree_search.setPlaceholderText(QCoreApplication.translate("MainWindow", u"Search topics and messages", None))
+        self.label_topic_rx.setText(QCoreApplication.translate("MainWindow", u"Topic:", None))
+        self.button_send_to_editor.setText(QCoreApplication.translate("MainWindow", u"Send to Editor", None))
+        self.rx_layout.setTabText(self.rx_layout.indexOf(self.page_text), QCoreApplication.translate("MainWindow", u"Text", None))
+        self.rx_layout.setTabText(self.rx_layout.indexOf(self.page_json), QCoreApplication.translate("MainWindow", u"JSON", None))
+        self.rx_layout.setTabText(self.rx_layout.indexOf(self.page_history), QCoreApplication.translate("MainWindow", u"History", None))
+        self.rx_layout.setTabText(self.rx_layout.indexOf(self.page_chart), QCoreApplication.translate("MainWindow", u"Chart", None))
+        self.label_payload.setText(QCoreApplication.translate("MainWindow", u"Payload", None))
+        self.label_qos.setText(QCoreApplication.translate("MainWindow", u"QoS", None))
+        self.button_publish.setText(QCoreApplication.translate("MainWindow", u"Publish", None))
+        self.label_topic.setText(QCoreApplication.translate("MainWindow", u"Topic", None))
+        self.label_retain.setText(QCoreApplication.translate("MainWindow", u"Retain", None))
+        self.checkbox_retain.setText("")
+    # retranslateUi
+
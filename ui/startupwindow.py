@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+## Form generated from reading UI file 'startupwindow.ui'
+##
+## Created by: Qt User Interface Compiler version 6.10.1
+##
+## WARNING! All changes made in this file will be lost when recompiling UI file!
+################################################################################
+
+from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
+    QMetaObject, QObject, QPoint, QRect,
+    QSize, QTime, QUrl, Qt)
+from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
+    QFont, QFontDatabase, QGradient, QIcon,
+    QImage, QKeySequence, QLinearGradient, QPainter,
+    QPalette, QPixmap, QRadialGradient, QTransform)
+from PySide6.QtWidgets import (QApplication, QFormLayout, QGroupBox, QHBoxLayout,
+    QLabel, QLayout, QLineEdit, QMainWindow,
+    QPlainTextEdit, QPushButton, QSizePolicy, QSpacerItem,
+    QSpinBox, QStatusBar, QVBoxLayout, QWidget)
+
+class Ui_StartupWindow(object):
+    def setupUi(self, StartupWindow):
+        if not StartupWindow.objectName():
+            StartupWindow.setObjectName(u"StartupWindow")
+        StartupWindow.resize(731, 329)
+        sizePolicy = QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(StartupWindow.sizePolicy().hasHeightForWidth())
+        StartupWindow.setSizePolicy(sizePolicy)
+        self.centralwidget = QWidget(StartupWindow)
+        self.centralwidget.setObjectName(u"centralwidget")
+        self.horizontalLayout = QHBoxLayout(self.centralwidget)
+        self.horizontalLayout.setObjectName(u"horizontalLayout")
+        self.formLayout_2 = QFormLayout()
+        self.formLayout_2.setObjectName(u"formLayout_2")
+        self.formLayout_2.setSizeConstraint(QLayout.SetDefaultConstraint)
+        self.formLayout_2.setFieldGrowthPolicy(QFormLayout.ExpandingFieldsGrow)
+        self.label_host = QLabel(self.centralwidget)
+        self.label_host.setObjectName(u"label_host")
+
+        self.formLayout_2.setWidget(0, QFormLayout.ItemRole.LabelRole, self.label_host)
+
+        self.text_host = QLineEdit(self.centralwidget)
+        self.text_host.setObjectName(u"text_host")
+
+        self.formLayout_2.setWidget(0, QFormLayout.ItemRole.FieldRole, self.text_host)
+
+        self.label_port = QLabel(self.centralwidget)
+        self.label_port.setObjectName(u"label_port")
+
+        self.formLayout_2.setWidget(1, QFormLayout.ItemRole.LabelRole, self.label_port)
+
+        self.num_port = QSpinBox(self.centralwidget)
+        self.num_port.setObjectName(u"num_port")
+        sizePolicy1 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        sizePolicy1.setHorizontalStretch(0)
+        sizePolicy1.setVerticalStretch(0)
+        sizePolicy1.setHeightForWidth(self.num_port.sizePolicy().hasHeightForWidth())
+        self.num_port.setSizePolicy(sizePolicy1)
+        self.num_port.setMinimum(1)
+        self.num_port.setMaximum(65535)
+        self.num_port.setValue(1883)
+
+        self.formLayout_2.setWidget(1, QFormLayout.ItemRole.FieldRole, self.num_port)
+
+        self.group_useauthn = QGroupBox(self.centralwidget)
+        self.group_useauthn.setObjectName(u"group_useauthn")
+        self.group_useauthn.setCheckable(True)
+        self.group_useauthn.setChecked(False)
+        self.verticalLayout = QVBoxLayout(self.group_useauthn)
+        self.verticalLayout.setObjectName(u"verticalLayout")
+        self.formLayout = QFormLayout()
+        self.formLayout.setObjectName(u"formLayout")
+        self.label_username = QLabel(self.group_useauthn)
+        self.label_username.setObjectName(u"label_username")
+
+        self.formLayout.setWidget(0, QFormLayout.ItemRole.LabelRole, self.label_username)
+
+        self.text_username = QLineEdit(self.group_useauthn)
+        self.text_username.setObjectName(u"text_username")
+
+        self.formLayout.setWidget(0, QFormLayout.ItemRole.FieldRole, self.text_username)
+
+        self.label_password = QLabel(self.group_useauthn)
+        self.label_password.setObjectName(u"label_password")
+
+        self.formLayout.setWidget(1, QFormLayout.ItemRole.LabelRole, self.label_password)
+
+        self.text_password = QLineEdit(self.group_useauthn)
+        self.text_password.setObjectName(u"text_password")
+
+        self.formLayout.setWidget(1, QFormLayout.ItemRole.FieldRole, self.text_password)
+
+
+        self.verticalLayout.addLayout(self.formLayout)
+
+
+        self.formLayout_2.setWidget(2, QFormLayout.ItemRole.SpanningRole, self.group_useauthn)
+
+        self.label_subscriptions = QLabel(self.centralwidget)
+        self.label_subscriptions.setObjectName(u"label_subscriptions")
+
+        self.formLayout_2.setWidget(3, QFormLayout.ItemRole.LabelRole, self.label_subscriptions)
+
+        self.text_subscriptions = QPlainTextEdit(self.centralwidget)
+        self.text_subscriptions.setObjectName(u"text_subscriptions")
+        self.text_subscriptions.setMaximumSize(QSize(16777215, 60))
+        self.text_subscriptions.setTabChangesFocus(True)
+
+        self.formLayout_2.setWidget(3, QFormLayout.ItemRole.FieldRole, self.text_subscriptions)
+
+        self.button_connect = QPushButton(self.centralwidget)
+        self.button_connect.setObjectName(u"button_connect")
+
+        self.formLayout_2.setWidget(4, QFormLayout.ItemRole.SpanningRole, self.button_connect)
+
+
+        self.horizontalLayout.addLayout(self.formLayout_2)
+
+        self.group_loadsession = QGroupBox(self.centralwidget)
+        self.group_loadsession.setObjectName(u"group_loadsession")
+        sizePolicy.setHeightForWidth(self.group_loadsession.sizePolicy().hasHeightForWidth())
+        self.group_loadsession.setSizePolicy(sizePolicy)
+        self.group_loadsession.setCheckable(True)
+        self.group_loadsession.setChecked(False)
+        self.verticalLayout_2 = QVBoxLayout(self.group_loadsession)
+        self.verticalLayout_2.setObjectName(u"verticalLayout_2")
+        self.horizontalLayout_2 = QHBoxLayout()
+        self.horizontalLayout_2.setObjectName(u"horizontalLayout_2")
+        self.horizontalLayout_2.setSizeConstraint(QLayout.SetDefaultConstraint)
+        self.text_session_path = QLineEdit(self.group_loadsession)
+        self.text_session_path.setObjectName(u"text_session_path")
+        self.text_session_path.setReadOnly(True)
+
+        self.horizontalLayout_2.addWidget(self.text_session_path)
+
+        self.button_browse_session = QPushButton(self.group_loadsession)
+        self.button_browse_session.setObjectName(u"button_browse_session")
+        sizePolicy2 = QSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Fixed)
+        sizePolicy2.setHorizontalStretch(0)
+        sizePolicy2.setVerticalStretch(0)
+        sizePolicy2.setHeightForWidth(self.button_browse_session.sizePolicy().hasHeightForWidth())
+        self.button_browse_session.setSizePolicy(sizePolicy2)
+        self.button_browse_session.setMinimumSize(QSize(0, 0))
+        self.button_browse_session.setMaximumSize(QSize(30, 16777215))
+        self.button_browse_session.setBaseSize(QSize(0, 0))
+
+        self.horizontalLayout_2.addWidget(self.button_browse_session)
+
+
+        self.verticalLayout_2.addLayout(self.horizontalLayout_2)
+
+        self.label_num_history_entries = QLabel(self.group_loadsession)
+        self.label_num_history_entries.setObjectName(u"label_num_history_entries")
+
+        self.verticalLayout_2.addWidget(self.label_num_history_entries)
+
+        self.verticalSpacer = QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
+
+        self.verticalLayout_2.addItem(self.verticalSpacer)
+
+
+        self.horizontalLayout.addWidget(self.group_loadsession)
+
+        self.horizontalLayout.setStretch(0, 66)
+        self.horizontalLayout.setStretch(1, 33)
+        StartupWindow.setCentralWidget(self.centralwidget)
+        self.status_bar = QStatusBar(StartupWindow)
+        self.status_bar.setObjectName(u"status_bar")
+        StartupWindow.setStatusBar(self.status_bar)
+
+        self.retranslateUi(StartupWindow)
+
+        QMetaObject.connectSlotsByName(StartupWindow)
+    # setupUi
+
+    def retranslateUi(self, StartupWindow):
+        StartupWindow.setWindowTitle(QCoreApplication.translate("StartupWindow", u"MQTT Navigator - session startup", None))
+        self.label_host.setText(QCoreApplication.translate("StartupWindow", u"Host", None))
+        self.label_port.setText(QCoreApplication.translate("StartupWindow", u"Port", None))
+        self.group_useauthn.setTitle(QCoreApplication.translate("StartupWindow", u"Use authentication", None))
+        self.label_username.setText(QCoreApplication.translate("StartupWindow", u"Username", None))
+        self.label_password.setText(QCoreApplication.translate("StartupWindow", u"Password", None))
+        self.label_subscriptions.setText(QCoreApplication.translate("StartupWindow", u"Subscriptions", None))
+#if QT_CONFIG(tooltip)
+        self.text_subscriptions.setToolTip(QCoreApplication.translate("StartupWindow", u"One topic filter per line, optionally followed by :QoS, e.g. sensors/+/temperature:1", None))
+#endif // QT_CONFIG(tooltip)
+        self.text_subscriptions.setPlainText(QCoreApplication.translate("StartupWindow", u"#", None))
+        self.button_connect.setText(QCoreApplication.translate("StartupWindow", u"Start", None))
+        self.group_loadsession.setTitle(QCoreApplication.translate("StartupWindow", u"Load saved session", None))
+        self.button_browse_session.setText(QCoreApplication.translate("StartupWindow", u"...", None))
+        self.label_num_history_entries.setText("")
+    # retranslateUi
+
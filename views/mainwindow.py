@@ -1,25 +1,54 @@
-import json
 import time
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from PySide6 import QtWidgets, QtCore, QtGui
 from PySide6 import QtCharts
 
-from common import consts
-from models.mqtreemodel import MqTreeNode, MqTreeModel
+from common import consts, metrics
+from models.chartdata import JsonPath, MqChartSeries
+from models.decoders import MqDecodedPayload, MqPayloadDecoders
+from models.historymodel import MqHistoryModel
+from models.mqtreemodel import MqTreeNode, MqTreeModel, MqTreeProxyModel
 from models.qjsonmodel import QJsonModel
+from models.session import SessionSaveWorker
+from views.metricsdock import MetricsDock
 from views.resettablezoomchartview import ResettableZoomChartView
+from views.subscriptionsdock import SubscriptionsDock
 from ui.mainwindow import Ui_MainWindow
 
 
+_filter_time = metrics.registry.histogram("filter_seconds", "Time to apply the topic filter")
+_history_view_time = metrics.registry.histogram(
+    "history_view_update_seconds", "Time to update the history table and chart"
+)
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, model: MqTreeModel, parent=None):
+    def __init__(
+        self,
+        model: MqTreeModel,
+        parent=None,
+        payload_decoders: Optional[MqPayloadDecoders] = None,
+    ):
         super().__init__(parent)
         self._selected_topic_model: Optional[MqTreeNode] = None
+        self._payload_decoders = payload_decoders or MqPayloadDecoders()
+        self._decoded_shown: Optional[MqDecodedPayload] = None
+        # Chart series of the selected topic, and the ones added from the context menus
+        self._selected_series: Optional[Tuple[MqChartSeries, QtCharts.QLineSeries]] = None
+        self._added_series: List[Tuple[MqChartSeries, QtCharts.QLineSeries]] = []
         self._raw_model = model
-        self._raw_model.messageReceived.connect(self._on_message)
+        self._raw_model.messagesReceived.connect(self._on_messages)
 
-        self._model = QtCore.QSortFilterProxyModel(self)
+        self._model = MqTreeProxyModel(self)
         self._model.setFilterKeyColumn(-1)  # All columns
         self._model.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
         self._model.setRecursiveFilteringEnabled(True)
@@ -31,6 +60,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def _setup_ui(self):
         self._ui.tree_view.setModel(self._model)
+        # Otherwise the view measures every row in a changed range, which is slow on large trees
+        self._ui.tree_view.setUniformRowHeights(True)
+        # Unsorted, in arrival order, until a column header is clicked
+        self._ui.tree_view.header().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+        self._ui.tree_view.setSortingEnabled(True)
         self._ui.tree_view.selectionModel().selectionChanged.connect(self._tree_selection_changed)
         self._ui.tree_view.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self._ui.tree_view.customContextMenuRequested.connect(self._show_context_menu)
@@ -41,6 +75,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self._action_delete.triggered.connect(self._delete_retained_messages)
         self._ui.tree_view.addAction(self._action_delete)
 
+        self._history_model = MqHistoryModel(self)
+        self._ui.table_history.setModel(self._history_model)
+
+        self._json_model = QJsonModel(self, read_only=True)
+        self._ui.tree_json_rx.setModel(self._json_model)
+        # Otherwise every changed value makes the view measure the rows again
+        self._ui.tree_json_rx.setUniformRowHeights(True)
+        self._ui.tree_json_rx.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self._ui.tree_json_rx.customContextMenuRequested.connect(self._show_json_context_menu)
+
         self._ui.button_send_to_editor.clicked.connect(self._send_to_editor_clicked)
         self._ui.button_publish.clicked.connect(self._publish_clicked)
         self._ui.text_tree_search.textChanged.connect(self._search_text_changed)
@@ -49,20 +93,98 @@ class MainWindow(QtWidgets.QMainWindow):
         self._ui.chart_view.setRubberBand(QtCharts.QChartView.RubberBand.RectangleRubberBand)
         self._ui.chart_view.setRenderHint(QtGui.QPainter.Antialiasing)
         self._chart = self._ui.chart_view.chart()  # type: QtCharts.QChart
-
-        self._chart.legend().hide()
-
         self._ui.chart_layout.addWidget(self._ui.chart_view)
 
         if not self._raw_model.has_mqtt():
             self._ui.button_send_to_editor.hide()
             self._ui.tx_widget.hide()
 
+        self._metrics_dock = MetricsDock(self)
+        self._metrics_dock.hide()
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self._metrics_dock)
+        button_metrics = QtWidgets.QToolButton()
+        button_metrics.setDefaultAction(self._metrics_dock.toggleViewAction())
+        button_metrics.setAutoRaise(True)
+
+        self._label_memory = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self._label_memory)
+        if self._raw_model.has_mqtt():
+            self._subscriptions_dock = SubscriptionsDock(self._raw_model, self)
+            self._subscriptions_dock.hide()
+            self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self._subscriptions_dock)
+            button_subscriptions = QtWidgets.QToolButton()
+            button_subscriptions.setDefaultAction(self._subscriptions_dock.toggleViewAction())
+            button_subscriptions.setAutoRaise(True)
+            self.statusBar().addPermanentWidget(button_subscriptions)
+        self.statusBar().addPermanentWidget(button_metrics)
+        self._status_timer = QtCore.QTimer(self)
+        self._status_timer.setInterval(1000)
+        self._status_timer.timeout.connect(self._update_status)
+        self._status_timer.start()
+        self._update_status()
+
+    def _update_status(self):
+        budget = self._raw_model.history_budget
+        text = f"History: {_format_size(budget.nbytes)}"
+        if budget.limits.total_max_bytes:
+            text += f" / {_format_size(budget.limits.total_max_bytes)}"
+        text += f", {budget.entries} entries, {budget.evicted} evicted"
+        text += f", {self._raw_model.root().rate():.0f} msgs/s"
+
+        dropped = self._raw_model.dropped_messages()
+        if dropped:
+            text += f", {dropped} messages dropped"
+        ingest_filter = self._raw_model.ingest_filter
+        if ingest_filter:
+            text += f", {ingest_filter.dropped} filtered"
+            self._label_memory.setToolTip("\n".join(ingest_filter.summary()))
+        self._label_memory.setText(text)
+        self._metrics_dock.refresh()
+
+        # Rates decay while no messages arrive, repainting rereads the visible ones
+        self._ui.tree_view.viewport().update()
+
     def _show_context_menu(self, position):
         menu = QtWidgets.QMenu()
         menu.addAction(self._action_delete)
+        index = self._model.mapToSource(self._ui.tree_view.indexAt(position))
+        if index.isValid():
+            self._add_chart_actions(menu, index.internalPointer(), ())
         menu.exec(self._ui.tree_view.viewport().mapToGlobal(position))
 
+    def _show_json_context_menu(self, position):
+        index = self._ui.tree_json_rx.indexAt(position)
+        if not index.isValid() or self._selected_topic_model is None:
+            return
+
+        # Keys and list indexes from the root of the decoded payload
+        path = []
+        item = index.internalPointer()
+        while item.parent() is not None:
+            path.append(item.key)
+            item = item.parent()
+
+        menu = QtWidgets.QMenu()
+        self._add_chart_actions(menu, self._selected_topic_model, tuple(reversed(path)))
+        menu.exec(self._ui.tree_json_rx.viewport().mapToGlobal(position))
+
+    def _add_chart_actions(self, menu: QtWidgets.QMenu, node: MqTreeNode, path: JsonPath):
+        added = self._find_added_series(node, path)
+        if added is None:
+            action = menu.addAction("Add to chart")
+            action.triggered.connect(lambda: self._add_chart_series(node, path))
+        else:
+            action = menu.addAction("Remove from chart")
+            action.triggered.connect(lambda: self._remove_chart_series(added))
+
+    def _find_added_series(
+        self, node: MqTreeNode, path: JsonPath
+    ) -> Optional[Tuple[MqChartSeries, QtCharts.QLineSeries]]:
+        for added in self._added_series:
+            if added[0].node is node and added[0].path == path:
+                return added
+        return None
+
     def _collect_topics(self, node: MqTreeNode) -> list[str]:
         topics = []
         if node.payload:
@@ -104,85 +226,108 @@ class MainWindow(QtWidgets.QMainWindow):
             for topic in topics:
                 self._raw_model.mqtt_publish(topic, payload=b"", qos=0, retain=True)
 
-    def _try_parse_and_display_json(self, payload):
-        try:
-            json_data = json.loads(payload)
-            json_model = QJsonModel(read_only=True)
-            json_model.load(json_data)
-            self._ui.tree_json_rx.setModel(json_model)
+    def _show_decoded_payload(self, model: MqTreeNode, *, selection_changed=False):
+        decoded = self._payload_decoders.decode(model.full_topic(), model.payload)
+        if decoded is self._decoded_shown:
+            return  # Same payload as shown, e.g. a device repeating its state
+        self._decoded_shown = decoded
+
+        tab = self._ui.rx_layout.indexOf(self._ui.page_json)
+        self._ui.rx_layout.setTabText(tab, decoded.title)
+        self._ui.rx_layout.setTabToolTip(tab, decoded.error or "")
+        # QJsonModel only loads dicts and lists
+        if isinstance(decoded.value, (dict, list)):
+            if selection_changed:
+                self._json_model.load(decoded.value)
+            else:  # Only apply the changes, keeping the expanded items and scroll position
+                self._json_model.update(decoded.value)
             self._ui.tree_json_rx.setDisabled(False)
-        except (json.JSONDecodeError, AssertionError):
-            # QJsonModel will assert if it gets something other than a dict
-            self._ui.tree_json_rx.setModel(None)
+        else:
+            self._json_model.clear()
             self._ui.tree_json_rx.setDisabled(True)
 
-    def _create_chart_axes(self, series):
-        ax_x = QtCharts.QDateTimeAxis()
-        ax_x.setFormat("HH:mm:ss")
-        self._chart.addAxis(ax_x, QtCore.Qt.AlignBottom)
-        series.attachAxis(ax_x)
-
-        ax_y = QtCharts.QValueAxis()
-        self._chart.addAxis(ax_y, QtCore.Qt.AlignLeft)
-        series.attachAxis(ax_y)
+    def _add_chart_series(self, node: MqTreeNode, path: JsonPath):
+        self._raw_model.touch(node)  # Before reading its history, see touch
+        decode = self._payload_decoders.rule(node.full_topic()).decode if path else None
+        chart_series = MqChartSeries(node, path, decode)
+        added = (chart_series, self._ui.chart_view.add_series(chart_series.name))
+        self._added_series.append(added)
+        self._update_chart_series(*added, new=True)
+        self._refresh_chart()
+
+    def _remove_chart_series(self, added: Tuple[MqChartSeries, QtCharts.QLineSeries]):
+        self._added_series.remove(added)
+        self._ui.chart_view.remove_series(added[1])
+        added[0].release()
+        self._refresh_chart()
+
+    def _update_chart_series(
+        self, chart_series: MqChartSeries, series: QtCharts.QLineSeries, *, new=False
+    ) -> bool:
+        """Give the new points of a series to the chart view, returns whether it changed"""
+        # Only the entries appended since the last update are parsed
+        evicted, appended = chart_series.update()
+        if not new and not evicted and not appended:
+            return False
 
-    def _update_history_table_and_chart(self, model, *, selection_changed=False):
-        # First, save the old row count in case we need to append to the table
-        start_row = self._ui.table_history.rowCount()
-        new_row_count = len(model.payload_history)
-        added_rows = new_row_count - start_row
-        self._ui.table_history.setRowCount(new_row_count)  # Resize the history table
-
-        if selection_changed:  # We need to clear the existing views and process all history entries
-            entries_to_process = model.payload_history
-            start_row = 0
-
-            # Clear the chart and add a new series
-            for axis in self._chart.axes():
-                self._chart.removeAxis(axis)
-            self._chart.removeAllSeries()
-
-            series = QtCharts.QLineSeries()
-            self._chart.addSeries(series)
-
-            # Add a new set of axes
-            self._create_chart_axes(series)
-        else:  # We only need to process the added entries
-            if not added_rows:
-                return  # So return if there weren't any
-            entries_to_process = model.payload_history[-added_rows:]  # added_rows last entries
-            series = self._chart.series()[0]  # The chart will only have one series
-
-        for row, (payload, ptime) in enumerate(entries_to_process, start=start_row):
-            self._ui.table_history.setItem(row, 0, QtWidgets.QTableWidgetItem(str(ptime)))
-            self._ui.table_history.setItem(row, 1, QtWidgets.QTableWidgetItem(payload))
-
-            try:  # Append the value to the chart series if it is numeric
-                numeric_value = float(payload)
-                series.append(ptime.timestamp() * 1000, numeric_value)
-            except ValueError:
-                pass
+        points = chart_series.points
+        self._ui.chart_view.set_points(
+            series,
+            points.x,
+            points.y,
+            points.x_sorted,
+            # Points were only appended, unless some were evicted or the series is new
+            appended=None if new or evicted else appended,
+        )
+        return True
 
+    def _refresh_chart(self):
         if not self._chart.isZoomed():
             self._ui.chart_view.fit_axes()
+        self._ui.chart_view.refresh()
+
+    def _update_history_table_and_chart(self, model, *, selection_changed=False):
+        if selection_changed:
+            self._history_model.set_history(model.payload_history)
+            if self._selected_series is not None:
+                self._ui.chart_view.remove_series(self._selected_series[1])
+            chart_series = MqChartSeries(model)
+            self._selected_series = (
+                chart_series,
+                self._ui.chart_view.add_series(chart_series.name),
+            )
+        else:
+            # The table reads its rows from the history, it only signals the changed ones
+            self._history_model.refresh()
+
+        if self._update_chart_series(*self._selected_series, new=selection_changed):
+            self._refresh_chart()
 
     def _selected_node_updated(self, *, selection_changed=False):
         model = self._selected_topic_model
 
         self._ui.text_topic_rx.setText(model.full_topic())
-        self._ui.text_payload_rx.setText(model.payload)
-
-        self._try_parse_and_display_json(model.payload)
-        self._update_history_table_and_chart(model, selection_changed=selection_changed)
-
-    def _on_message(self, node: MqTreeNode):
-        if node == self._selected_topic_model:  # If the change is for the selected node
+        self._ui.text_payload_rx.setText(model.payload_text())
+
+        self._show_decoded_payload(model, selection_changed=selection_changed)
+        with _history_view_time.time():
+            self._update_history_table_and_chart(model, selection_changed=selection_changed)
+
+    def _on_messages(self, nodes: List[MqTreeNode]):
+        if self._added_series:
+            changed = set(nodes)
+            updated = [
+                self._update_chart_series(*added)
+                for added in self._added_series
+                if added[0].node in changed
+            ]
+            if any(updated):
+                self._refresh_chart()
+
+        # If one of the changes is for the selected node
+        if any(node is self._selected_topic_model for node in nodes):
             self._selected_node_updated(selection_changed=False)  # Update the view
 
-        # Refresh the filter proxy model. This *theoretically* shouldn't be necessary,
-        # but not doing it makes extra rows appear
-        self._model.invalidate()
-
     def _tree_selection_changed(self, selected: QtCore.QItemSelectionModel, _deselected):
         selected = self._model.mapSelectionToSource(selected)
         indexes = selected.indexes()
@@ -191,11 +336,14 @@ class MainWindow(QtWidgets.QMainWindow):
 
         model: MqTreeNode = indexes[0].internalPointer()
         self._selected_topic_model = model
+        # Before showing the history, which it reads for nodes from lazily loaded sessions
+        self._raw_model.touch(model)
         self._selected_node_updated(selection_changed=True)
 
     def _search_text_changed(self):
         text = self._ui.text_tree_search.text()
-        self._model.setFilterFixedString(text)
+        with _filter_time.time():
+            self._model.setFilterFixedString(text)
 
     def _send_to_editor_clicked(self):
         self._ui.text_topic.setText(self._ui.text_topic_rx.toPlainText())
@@ -219,21 +367,33 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             event.ignore()
 
-    def _ask_save_path(self) -> Optional[str]:
-        filepath, _filetype = QtWidgets.QFileDialog.getSaveFileName(
-            self, "Save session", "", consts.SESSION_FILE_TYPES
+    def _ask_save_path(self) -> (Optional[str], bool):
+        filepath, filetype = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Save session", "", consts.SESSION_SAVE_FILE_TYPES
         )
 
-        return filepath
+        return filepath, filetype != consts.SESSION_JSON_FILE_TYPE
 
-    def _save_session(self, path: str) -> bool:
-        try:
-            with open(path, "w") as sessionfile:
-                json.dump(self._raw_model.serialize(), sessionfile, separators=(",", ":"))
-        except:
-            return False
+    def _save_session(self, path: str, *, binary: bool = True) -> bool:
+        # The tree must not change while the worker thread walks it
+        self._raw_model.pause_ingestion()
 
-        return True
+        worker = SessionSaveWorker(path, self._raw_model, self, binary=binary)
+        progress = QtWidgets.QProgressDialog("Saving session...", None, 0, worker.total, self)
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        worker.progress.connect(progress.setValue)
+        # Shown right away, expanding lazily loaded nodes while the worker walks them must wait
+        progress.show()
+
+        loop = QtCore.QEventLoop()
+        worker.finished.connect(loop.quit)
+        worker.start()
+        loop.exec()
+        progress.close()
+
+        if not worker.succeeded:
+            self._raw_model.resume_ingestion()
+        return worker.succeeded
 
     def _ask_close(self) -> bool:
         buttons = QtWidgets.QMessageBox.StandardButtons(
@@ -249,11 +409,11 @@ class MainWindow(QtWidgets.QMainWindow):
         elif answer == QtWidgets.QMessageBox.No:
             return True
 
-        path = self._ask_save_path()
+        path, binary = self._ask_save_path()
         if not path:
             return False  # Don't close if user clicked "Yes" and didn't provide a path
 
-        if not self._save_session(path):
+        if not self._save_session(path, binary=binary):
             QtWidgets.QMessageBox.critical(self, "Error", "Failed to save session")
             return False
 
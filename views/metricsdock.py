@@ -0,0 +1,76 @@
+from PySide6 import QtWidgets, QtCore
+
+from common import metrics
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
+
+
+class MetricsDock(QtWidgets.QDockWidget):
+    """Shows the current instrumentation metrics, refreshed while visible"""
+
+    COLUMNS = ("Metric", "Value", "Mean", "p50", "p99", "Max")
+
+    def __init__(self, parent=None, registry: metrics.MetricsRegistry = metrics.registry):
+        super().__init__("Metrics", parent)
+        self.setObjectName("metrics_dock")
+        self._registry = registry
+
+        self._table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self._table.setHorizontalHeaderLabels(self.COLUMNS)
+        self._table.verticalHeader().hide()
+        self._table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self._table.horizontalHeader().setSectionResizeMode(
+            QtWidgets.QHeaderView.ResizeToContents
+        )
+
+        button_export = QtWidgets.QPushButton("Export...")
+        button_export.clicked.connect(self._export_clicked)
+
+        widget = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout(widget)
+        layout.addWidget(self._table)
+        layout.addWidget(button_export, 0, QtCore.Qt.AlignRight)
+        self.setWidget(widget)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        registry_metrics = self._registry.metrics()
+        self._table.setRowCount(len(registry_metrics))
+        for row, metric in enumerate(registry_metrics):
+            if isinstance(metric, metrics.Histogram):
+                summary = metric.summary()
+                cells = [
+                    str(summary["count"]),
+                    _format_seconds(summary["mean"]),
+                    _format_seconds(summary["p50"]),
+                    _format_seconds(summary["p99"]),
+                    _format_seconds(summary["max"]),
+                ]
+            else:
+                cells = [str(metric.value), "", "", "", ""]
+
+            for column, text in enumerate([metric.name, *cells]):
+                item = QtWidgets.QTableWidgetItem(text)
+                if column == 0:
+                    item.setToolTip(metric.help)
+                self._table.setItem(row, column, item)
+
+    def _export_clicked(self):
+        path, _filetype = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export metrics", "", "JSON files (*.json)"
+        )
+        if not path:
+            return
+
+        try:
+            self._registry.write_json(path)
+        except OSError:
+            QtWidgets.QMessageBox.critical(self, "Error", "Failed to export metrics.")
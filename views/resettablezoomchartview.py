@@ -1,42 +1,145 @@
-from typing import List
+from typing import Dict, Optional, Tuple
 import math
 
+import numpy as np
 from PySide6 import QtGui, QtCore
 from PySide6 import QtCharts
 
+from common import metrics
+from models.chartdata import downsample_min_max
+
+_downsample_time = metrics.registry.histogram(
+    "chart_downsample_seconds", "Time to pick the chart points to draw"
+)
+
+
+def _extents(x: np.ndarray, y: np.ndarray) -> Tuple[float, float, float, float]:
+    return float(x.min()), float(x.max()), float(y.min()), float(y.max())
+
+
+class _SeriesPoints:
+    __slots__ = ("x", "y", "x_sorted", "extents")
+
+    def __init__(self):
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.x_sorted = True
+        # x_min, x_max, y_min, y_max of the points, None without points
+        self.extents: Optional[Tuple[float, float, float, float]] = None
+
 
 class ResettableZoomChartView(QtCharts.QChartView):
+    """Chart view of line series sharing a time axis, drawn from points given with set_points.
+
+    Only the points needed for the visible range and the chart width are given to the series,
+    picked again when zooming or resizing. The extents of the points, used to fit the axes,
+    are kept up to date from the appended points only.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._points: Dict[QtCharts.QLineSeries, _SeriesPoints] = {}
+
+        chart = self.chart()
+        self._ax_x = QtCharts.QDateTimeAxis()
+        self._ax_x.setFormat("HH:mm:ss")
+        chart.addAxis(self._ax_x, QtCore.Qt.AlignBottom)
+        self._ax_y = QtCharts.QValueAxis()
+        chart.addAxis(self._ax_y, QtCore.Qt.AlignLeft)
+        chart.legend().hide()
+
     def mouseReleaseEvent(self, event: QtGui.QMouseEvent):
         if event.button() == QtGui.Qt.RightButton:
             self.fit_axes()
             self.chart().zoomReset()
         else:
             super().mouseReleaseEvent(event)
+        self.refresh()  # Zooming with the rubber band also ends here
 
-    def fit_axes(self):
+    def resizeEvent(self, event: QtGui.QResizeEvent):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def showEvent(self, event: QtGui.QShowEvent):
+        super().showEvent(event)
+        self.refresh()
+
+    def add_series(self, name: str) -> QtCharts.QLineSeries:
+        series = QtCharts.QLineSeries()
+        series.setName(name)
         chart = self.chart()
-        points: List[QtCore.QPointF] = chart.series()[0].points()
-
-        ax_x = chart.axisX()
-        ax_y = chart.axisY()
-
-        min_x, max_x, min_y, max_y = math.inf, -math.inf, math.inf, -math.inf
-        for point in points:
-            x = point.x()
-            if x < min_x:
-                min_x = x
-            if x > max_x:
-                max_x = x
-
-            y = point.y()
-            if y < min_y:
-                min_y = y
-            if y > max_y:
-                max_y = y
-
-        if all(v != math.inf for v in (min_x, max_x, min_y, max_y)):
-            ax_x.setRange(
-                QtCore.QDateTime.fromMSecsSinceEpoch(math.floor(min_x)),
-                QtCore.QDateTime.fromMSecsSinceEpoch(math.ceil(max_x)),
+        chart.addSeries(series)
+        series.attachAxis(self._ax_x)
+        series.attachAxis(self._ax_y)
+        self._points[series] = _SeriesPoints()
+        # Series are told apart by their name when there are several
+        chart.legend().setVisible(len(self._points) > 1)
+        return series
+
+    def remove_series(self, series: QtCharts.QLineSeries):
+        self.chart().removeSeries(series)
+        del self._points[series]
+        self.chart().legend().setVisible(len(self._points) > 1)
+
+    def set_points(
+        self,
+        series: QtCharts.QLineSeries,
+        x: np.ndarray,
+        y: np.ndarray,
+        x_sorted: bool = True,
+        appended: Optional[int] = None,
+    ):
+        """Set all the points of a series. The arrays are used until the next call, call
+        refresh() to draw them.
+
+        appended is the number of points appended at the end since the previous call, if no
+        other point changed. Otherwise the extents are computed again from all the points.
+        """
+        points = self._points[series]
+        points.x = x
+        points.y = y
+        points.x_sorted = x_sorted
+
+        if not len(x):
+            points.extents = None
+        elif appended is None or points.extents is None:
+            points.extents = _extents(x, y)
+        elif appended:
+            x_min, x_max, y_min, y_max = points.extents
+            new_x_min, new_x_max, new_y_min, new_y_max = _extents(x[-appended:], y[-appended:])
+            points.extents = (
+                min(x_min, new_x_min),
+                max(x_max, new_x_max),
+                min(y_min, new_y_min),
+                max(y_max, new_y_max),
             )
-            ax_y.setRange(math.floor(min_y), math.ceil(max_y))
+
+    def refresh(self):
+        if not self.isVisible():
+            return  # Refreshed when shown
+
+        x_min = self._ax_x.min().toMSecsSinceEpoch()
+        x_max = self._ax_x.max().toMSecsSinceEpoch()
+        columns = math.ceil(self.chart().plotArea().width())
+        with _downsample_time.time():
+            for series, points in self._points.items():
+                if not len(points.x):
+                    series.clear()
+                    continue
+
+                x, y = downsample_min_max(
+                    points.x, points.y, x_min, x_max, columns, points.x_sorted
+                )
+                series.replaceNp(x, y)
+
+    def fit_axes(self):
+        extents = [points.extents for points in self._points.values() if points.extents]
+        if not extents:
+            return
+
+        x_mins, x_maxs, y_mins, y_maxs = zip(*extents)
+        self._ax_x.setRange(
+            QtCore.QDateTime.fromMSecsSinceEpoch(math.floor(min(x_mins))),
+            QtCore.QDateTime.fromMSecsSinceEpoch(math.ceil(max(x_maxs))),
+        )
+        self._ax_y.setRange(math.floor(min(y_mins)), math.ceil(max(y_maxs)))
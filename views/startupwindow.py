@@ -1,11 +1,20 @@
-import json
-from typing import Optional
+from typing import Dict, Optional, Sequence
 
 from PySide6 import QtWidgets, QtCore
 
 from common import consts
+from models.decoders import MqDecoderRule, MqPayloadDecoders
+from models.ingestrules import MqIngestRule
 from models.mqtreemodel import MqTreeModel
-from models.mqttlistener import MqttListener
+from models.mqttlistener import (
+    MqttListener,
+    default_subscriptions,
+    format_subscription,
+    parse_subscriptions,
+)
+from models.payloadhistory import MqHistoryLimits
+from models.replay import MqReplayer, session_messages
+from models.session import load_session
 from ui.startupwindow import Ui_StartupWindow
 from views.mainwindow import MainWindow
 
@@ -22,15 +31,32 @@ class StartupWindow(QtWidgets.QMainWindow):
         username: Optional[str] = None,
         password: Optional[str] = None,
         load_session: Optional[str] = None,
+        batch_interval_ms: int = consts.DEFAULT_BATCH_INTERVAL_MS,
+        history_limits: Optional[MqHistoryLimits] = None,
+        replay: Optional[str] = None,
+        replay_speed: float = 1.0,
+        replay_publish: bool = False,
+        subscriptions: Optional[Dict[str, int]] = None,
+        ingest_rules: Sequence[MqIngestRule] = (),
+        decoder_rules: Sequence[MqDecoderRule] = (),
     ):
         super().__init__(parent)
 
+        self._batch_interval_ms = batch_interval_ms
+        self._history_limits = history_limits
+        self._ingest_rules = ingest_rules
+        self._decoder_rules = decoder_rules
+        self._replay_path = replay
+        self._replay_speed = replay_speed
+        self._replay_publish = replay_publish
+
         self.connected.connect(self._connected)
         self.connection_failed.connect(self._connection_failed)
 
         self._mainwindow: Optional[MainWindow] = None
         self._mainwindow_model: Optional[MqTreeModel] = None
-        self._saved_state = {}
+        self._mqtt_listener: Optional[MqttListener] = None
+        self._saved_state = None
 
         self._ui = Ui_StartupWindow()
         self._setup_ui()
@@ -46,8 +72,11 @@ class StartupWindow(QtWidgets.QMainWindow):
                 self._ui.text_username.setText(username)
                 self._ui.text_password.setText(password or "")
 
-        if self._ui.text_host.text():
-            # Session or argument might have filled it
+        if subscriptions is not None:  # Given on the command line, overrides the session's
+            self._set_subscriptions(subscriptions)
+
+        if self._ui.text_host.text() or replay:
+            # Session or argument might have filled it, a replay can run without a broker
             self._connect_clicked()
 
     def _setup_ui(self):
@@ -55,13 +84,15 @@ class StartupWindow(QtWidgets.QMainWindow):
         self._ui.button_connect.clicked.connect(self._connect_clicked)
         self._ui.button_browse_session.clicked.connect(self._load_session)
 
-    def _get_host_and_state(self) -> (str, dict):
+    def _get_host_and_state(self) -> (str, object):
         # Don't restore state if the checkbox was unchecked after loading it
         if self._ui.group_loadsession.isChecked():
             state = self._saved_state
             if not state:
                 QtWidgets.QMessageBox.information(
-                    self, "Session", 'Please select a session file or uncheck "Load saved session".'
+                    self,
+                    "Session",
+                    'Please select a session file or uncheck "Load saved session".',
                 )
                 return
         else:
@@ -73,36 +104,57 @@ class StartupWindow(QtWidgets.QMainWindow):
 
     def _connect_clicked(self):
         host, state = self._get_host_and_state()
-        if not state and not host:
+        if not state and not host and not self._replay_path:
             QtWidgets.QMessageBox.warning(
                 self,
                 "Invalid settings",
-                "Please enter a host to connect to, or load a saved session to browse it without connecting.",
+                "Please enter a host to connect to, or load a saved session to browse it "
+                "without connecting.",
             )
             return
 
         if host:
+            try:
+                subscriptions = parse_subscriptions(
+                    self._ui.text_subscriptions.toPlainText().splitlines()
+                )
+            except ValueError as e:
+                QtWidgets.QMessageBox.warning(self, "Invalid subscriptions", str(e))
+                return
+
             port = self._ui.num_port.value()
             if self._ui.group_useauthn.isChecked():
                 username = self._ui.text_username.text()
                 password = self._ui.text_password.text()
-                mqtt_listener = MqttListener(host, port, username, password)
+                mqtt_listener = MqttListener(host, port, username, password, subscriptions)
             else:
-                mqtt_listener = MqttListener(host, port)
+                mqtt_listener = MqttListener(host, port, subscriptions=subscriptions)
 
+            self._mqtt_listener = mqtt_listener
             mqtt_listener.add_connect_fail_listener(self._on_connection_failed)
             mqtt_listener.add_connect_listener(self._on_connected)
 
             self._ui.status_bar.showMessage("Connecting...")
             self._mainwindow_model = MqTreeModel(
-                self, mqtt_listener=mqtt_listener, saved_state=state
+                self,
+                mqtt_listener=mqtt_listener,
+                session=state,
+                batch_interval_ms=self._batch_interval_ms,
+                history_limits=self._history_limits,
+                ingest_rules=self._ingest_rules,
             )
             mqtt_listener.connect()  # Will end up calling _connected or _connection_failed
         else:
-            self._mainwindow_model = MqTreeModel(self, saved_state=state)
+            self._mainwindow_model = MqTreeModel(
+                self,
+                session=state,
+                batch_interval_ms=self._batch_interval_ms,
+                history_limits=self._history_limits,
+                ingest_rules=self._ingest_rules,
+            )
             self._connected()  # Call _connected directly to proceed to the main window
 
-    def _load_session_file(self, filepath: Optional[str] = None) -> Optional[dict]:
+    def _load_session_file(self, filepath: Optional[str] = None):
         if not filepath:
             filepath, _filetype = QtWidgets.QFileDialog.getOpenFileName(
                 self, "Open session", "", consts.SESSION_FILE_TYPES
@@ -112,8 +164,7 @@ class StartupWindow(QtWidgets.QMainWindow):
             return
 
         try:
-            with open(filepath) as session_file:
-                session = json.load(session_file)
+            session = load_session(filepath)
         except:
             QtWidgets.QMessageBox.critical(self, "Error", "Failed to open session file.")
             return
@@ -121,29 +172,19 @@ class StartupWindow(QtWidgets.QMainWindow):
         self._ui.text_session_path.setText(filepath)
         return session
 
-    def _count_history_entries(self, state):
-        entries = len(state[consts.SESSION_HISTORY_KEY])
-        if state[consts.SESSION_CHILDREN_KEY]:
-            entries += sum(
-                self._count_history_entries(c) for c in state[consts.SESSION_CHILDREN_KEY]
-            )
-
-        return entries
-
     def _load_session(self, filepath: Optional[str] = None):
         session = self._load_session_file(filepath)
         if not session:
             return
 
-        config = session["config"]
-        state = session["state"]
+        config = session.config
 
-        self._saved_state = state
+        self._saved_state = session
 
         self._ui.text_host.setText(config["host"])
         self._ui.num_port.setValue(config["port"])
         self._ui.label_num_history_entries.setText(
-            f"Session contains {self._count_history_entries(state)} history entries."
+            f"Session contains {session.history_entry_count()} history entries."
         )
 
         username = config["username"]
@@ -156,8 +197,16 @@ class StartupWindow(QtWidgets.QMainWindow):
             self._ui.text_username.setText("")
             self._ui.text_password.setText("")
 
+        # Sessions saved before subscriptions were configurable subscribed to everything
+        self._set_subscriptions(config.get("subscriptions", default_subscriptions()))
+
         self._ui.status_bar.showMessage("Loaded session.")
 
+    def _set_subscriptions(self, subscriptions: Dict[str, int]):
+        self._ui.text_subscriptions.setPlainText(
+            "\n".join(format_subscription(topic, qos) for topic, qos in subscriptions.items())
+        )
+
     def _on_connection_failed(self):
         self.connection_failed.emit()
 
@@ -168,6 +217,43 @@ class StartupWindow(QtWidgets.QMainWindow):
         self.connected.emit()
 
     def _connected(self):
-        self._mainwindow = MainWindow(self._mainwindow_model)
+        self._mainwindow = MainWindow(
+            self._mainwindow_model, payload_decoders=MqPayloadDecoders(self._decoder_rules)
+        )
         self._mainwindow.show()
         self.close()
+
+        if self._replay_path:
+            self._start_replay()
+
+    def _start_replay(self):
+        try:
+            session = load_session(self._replay_path)
+        except:
+            QtWidgets.QMessageBox.critical(self._mainwindow, "Error", "Failed to open replay file.")
+            return
+
+        # Republished messages reach the model through the broker subscription
+        publisher = self._mqtt_listener if self._replay_publish else None
+        replayer = MqReplayer(
+            session_messages(session),
+            speed=self._replay_speed,
+            model=None if publisher else self._mainwindow_model,
+            publisher=publisher,
+            parent=self._mainwindow_model,
+        )
+
+        status_bar = self._mainwindow.statusBar()
+        replayer.progress.connect(
+            lambda count: status_bar.showMessage(f"Replayed {count} messages")
+        )
+        replayer.replayed.connect(
+            lambda count, elapsed: status_bar.showMessage(
+                f"Replayed {count} messages in {elapsed:.1f} s "
+                f"({count / max(elapsed, 1e-9):.0f} messages/s)"
+            )
+        )
+        QtWidgets.QApplication.instance().aboutToQuit.connect(replayer.stop)
+
+        status_bar.showMessage("Replaying...")
+        replayer.start()
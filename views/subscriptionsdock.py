@@ -0,0 +1,73 @@
+from PySide6 import QtWidgets, QtCore
+
+from models.mqtreemodel import MqTreeModel
+
+
+class SubscriptionsDock(QtWidgets.QDockWidget):
+    """Lists the broker subscriptions and changes them while connected"""
+
+    COLUMNS = ("Topic filter", "QoS")
+
+    def __init__(self, model: MqTreeModel, parent=None):
+        super().__init__("Subscriptions", parent)
+        self.setObjectName("subscriptions_dock")
+        self._model = model
+
+        self._table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self._table.setHorizontalHeaderLabels(self.COLUMNS)
+        self._table.verticalHeader().hide()
+        self._table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self._table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self._table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self._table.horizontalHeader().setSectionResizeMode(
+            1, QtWidgets.QHeaderView.ResizeToContents
+        )
+
+        self._text_topic = QtWidgets.QLineEdit()
+        self._text_topic.setPlaceholderText("Topic filter, e.g. sensors/+/temperature")
+        self._text_topic.returnPressed.connect(self._subscribe_clicked)
+        self._num_qos = QtWidgets.QSpinBox()
+        self._num_qos.setRange(0, 2)
+        self._num_qos.setPrefix("QoS ")
+        button_subscribe = QtWidgets.QPushButton("Subscribe")
+        button_subscribe.clicked.connect(self._subscribe_clicked)
+        button_unsubscribe = QtWidgets.QPushButton("Unsubscribe")
+        button_unsubscribe.clicked.connect(self._unsubscribe_clicked)
+
+        add_layout = QtWidgets.QHBoxLayout()
+        add_layout.addWidget(self._text_topic)
+        add_layout.addWidget(self._num_qos)
+        add_layout.addWidget(button_subscribe)
+
+        widget = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout(widget)
+        layout.addWidget(self._table)
+        layout.addLayout(add_layout)
+        layout.addWidget(button_unsubscribe, 0, QtCore.Qt.AlignRight)
+        self.setWidget(widget)
+
+        self.refresh()
+
+    def refresh(self):
+        subscriptions = self._model.mqtt_subscriptions()
+        self._table.setRowCount(len(subscriptions))
+        for row, (topic, qos) in enumerate(subscriptions.items()):
+            self._table.setItem(row, 0, QtWidgets.QTableWidgetItem(topic))
+            self._table.setItem(row, 1, QtWidgets.QTableWidgetItem(str(qos)))
+
+    def _subscribe_clicked(self):
+        topic = self._text_topic.text()
+        try:
+            self._model.mqtt_subscribe(topic, self._num_qos.value())
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Invalid topic filter", str(e))
+            return
+
+        self._text_topic.clear()
+        self.refresh()
+
+    def _unsubscribe_clicked(self):
+        rows = {index.row() for index in self._table.selectionModel().selectedRows()}
+        for row in rows:
+            self._model.mqtt_unsubscribe(self._table.item(row, 0).text())
+        self.refresh()